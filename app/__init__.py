@@ -6,12 +6,15 @@ from app.blueprints.auth import auth
 from app.blueprints.commands import commands
 from app.blueprints.errors import errors
 from app.blueprints.main import main
+from app.blueprints.metrics import metrics
 from app.blueprints.templating import templating
 from app.blueprints.user import user
+from app.caching import init_page_cache
 from app.config import config
 from app.extensions import (
     avatars,
     bootstrap,
+    cache,
     csrf,
     db,
     dropzone,
@@ -19,6 +22,11 @@ from app.extensions import (
     mail,
     whooshee,
 )
+from app.instrumentation import init_instrumentation
+from app.profiler import init_profiler
+from app.sqlite import init_sqlite
+from app.startup import init_templates
+from app.telemetry import init_telemetry
 
 
 def create_app(config_name="development"):
@@ -28,12 +36,19 @@ def create_app(config_name="development"):
     # extensions
     bootstrap.init_app(app)
     db.init_app(app)
+    init_sqlite(app)
+    init_instrumentation(app)
+    init_telemetry(app)
+    init_profiler(app)
     login.init_app(app)
     mail.init_app(app)
     avatars.init_app(app)
     dropzone.init_app(app)
     csrf.init_app(app)
     whooshee.init_app(app)
+    cache.init_app(app)
+    init_page_cache(app)
+    init_templates(app)
 
     # blueprints
     app.register_blueprint(commands)
@@ -44,5 +59,6 @@ def create_app(config_name="development"):
     app.register_blueprint(auth, url_prefix="/auth")
     app.register_blueprint(admin, url_prefix="/admin")
     app.register_blueprint(ajax, url_prefix="/ajax")
+    app.register_blueprint(metrics)
 
     return app
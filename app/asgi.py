@@ -0,0 +1,255 @@
+import asyncio
+import json
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qsl
+
+from flask_login.utils import decode_cookie
+from itsdangerous import BadSignature
+from sqlalchemy import func, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from werkzeug.datastructures import MultiDict
+from werkzeug.exceptions import MethodNotAllowed, NotFound
+
+from app.extensions import AnonymousUser, cache
+from app.models import Notification, Photo, User
+from app.profiles import (
+    PROFILE_CARD_TEMPLATE,
+    PROFILE_POPUP_TEMPLATE,
+    card_key,
+    cards_query,
+    profiles_query,
+    render_popups,
+)
+from app.sqlite import configure_engine
+from app.state import (
+    by_id,
+    followers_count,
+    photos_state,
+    requested_ids,
+    users_state,
+)
+
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def async_database_url(url):
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername))
+
+
+class Response:
+    def __init__(self, body, status=200, content_type="application/json"):
+        if content_type == "application/json":
+            body = json.dumps(body, separators=(",", ":"), sort_keys=True)
+        self.body = body.encode()
+        self.status = status
+        self.content_type = content_type
+
+    async def __call__(self, send):
+        await send(
+            dict(
+                type="http.response.start",
+                status=self.status,
+                headers=[
+                    (b"content-type", self.content_type.encode()),
+                    (b"content-length", str(len(self.body)).encode()),
+                ],
+            )
+        )
+        await send(dict(type="http.response.body", body=self.body))
+
+
+class AsyncAjax:
+    def __init__(self, app):
+        self.app = app
+        self.engine = create_async_engine(
+            app.config["ASYNC_DATABASE_URL"]
+            or async_database_url(app.config["SQLALCHEMY_DATABASE_URI"])
+        )
+        configure_engine(self.engine.sync_engine, app.config["SQLITE_PRAGMAS"])
+        self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.serializer = app.session_interface.get_signing_serializer(app)
+        self.card_template = app.jinja_env.get_template(PROFILE_CARD_TEMPLATE)
+        self.popup_template = app.jinja_env.get_template(PROFILE_POPUP_TEMPLATE)
+        self.views = {
+            "ajax.get_profile": self.get_profile,
+            "ajax.get_profiles": self.get_profiles,
+            "ajax.followers_count": self.followers_count,
+            "ajax.collectors_count": self.collectors_count,
+            "ajax.notifications_count": self.notifications_count,
+            "ajax.get_state": self.get_state,
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send(dict(type="lifespan.startup.complete"))
+                elif message["type"] == "lifespan.shutdown":
+                    await self.engine.dispose()
+                    await send(dict(type="lifespan.shutdown.complete"))
+                    return
+        if scope["type"] != "http":
+            return
+        adapter = self.app.url_map.bind("", url_scheme=scope["scheme"])
+        try:
+            endpoint, values = adapter.match(scope["path"], scope["method"])
+        except MethodNotAllowed:
+            return await Response({"message": "Method not allowed."}, 405)(send)
+        except NotFound:
+            endpoint = None
+        view = self.views.get(endpoint)
+        if view is None:
+            return await Response({"message": "Not found."}, 404)(send)
+        async with self.sessions() as session:
+            response = await view(
+                session, adapter, self.load_cookies(scope), scope, **values
+            )
+        await response(send)
+
+    def load_cookies(self, scope):
+        cookie = SimpleCookie()
+        for name, value in scope["headers"]:
+            if name == b"cookie":
+                cookie.load(value.decode("latin-1"))
+        return {key: morsel.value for key, morsel in cookie.items()}
+
+    def query_args(self, scope):
+        return MultiDict(parse_qsl(scope["query_string"].decode("latin-1")))
+
+    def user_id(self, cookies):
+        session = {}
+        value = cookies.get(self.app.config["SESSION_COOKIE_NAME"])
+        if value is not None:
+            try:
+                session = self.serializer.loads(
+                    value,
+                    max_age=int(self.app.permanent_session_lifetime.total_seconds()),
+                )
+            except BadSignature:
+                pass
+        if "_user_id" in session:
+            return session["_user_id"]
+        remember = cookies.get(
+            self.app.config.get("REMEMBER_COOKIE_NAME", "remember_token")
+        )
+        if remember is not None and session.get("_remember") != "clear":
+            with self.app.app_context():
+                return decode_cookie(remember)
+
+    async def load_user(self, session, cookies):
+        user_id = self.user_id(cookies)
+        user = user_id and await session.get(User, int(user_id))
+        return user or AnonymousUser()
+
+    def get_cards(self, keys):
+        with self.app.app_context():
+            return cache.get_many(*keys)
+
+    def set_cards(self, cards):
+        with self.app.app_context():
+            cache.set_many(cards, timeout=self.app.config["PROFILE_CACHE_TIMEOUT"])
+
+    async def load_popups(self, session, adapter, cookies, ids):
+        current_user = await self.load_user(session, cookies)
+        viewer_id = current_user.id if current_user.is_authenticated else None
+        profiles = (await session.execute(profiles_query(ids, viewer_id))).all()
+        if not profiles:
+            return {}
+
+        def url_for(endpoint, **values):
+            return adapter.build(endpoint, values)
+
+        cards = dict(
+            zip(
+                [profile.id for profile in profiles],
+                await asyncio.to_thread(self.get_cards, map(card_key, profiles)),
+            )
+        )
+        missing = [id for id, card in cards.items() if card is None]
+        if missing:
+            for user, followers, photos in await session.execute(cards_query(missing)):
+                cards[user.id] = self.card_template.render(
+                    user=user,
+                    followers_count=followers,
+                    photos_count=photos,
+                    url_for=url_for,
+                )
+            await asyncio.to_thread(
+                self.set_cards,
+                {
+                    card_key(profile): cards[profile.id]
+                    for profile in profiles
+                    if profile.id in missing and cards[profile.id] is not None
+                },
+            )
+        return render_popups(
+            self.popup_template,
+            [profile for profile in profiles if cards[profile.id] is not None],
+            cards,
+            current_user=current_user,
+            url_for=url_for,
+        )
+
+    async def get_profile(self, session, adapter, cookies, scope, id):
+        popups = await self.load_popups(session, adapter, cookies, [id])
+        if id not in popups:
+            return Response({"message": "Not found."}, 404)
+        return Response(popups[id], content_type="text/html; charset=utf-8")
+
+    async def get_profiles(self, session, adapter, cookies, scope):
+        ids = list(dict.fromkeys(self.query_args(scope).getlist("id", type=int)))
+        if len(ids) > self.app.config["AJAX_STATE_MAX_IDS"]:
+            return Response({"message": "Too many ids."}, 400)
+        return Response(
+            await self.load_popups(session, adapter, cookies, ids) if ids else {}
+        )
+
+    async def followers_count(self, session, adapter, cookies, scope, id):
+        count = await session.scalar(
+            select(followers_count(User.id)).where(User.id == id)
+        )
+        if count is None:
+            return Response({"message": "Not found."}, 404)
+        return Response({"count": count})
+
+    async def collectors_count(self, session, adapter, cookies, scope, id):
+        count = await session.scalar(select(Photo.collections_count).filter_by(id=id))
+        if count is None:
+            return Response({"message": "Not found."}, 404)
+        return Response({"count": count})
+
+    async def notifications_count(self, session, adapter, cookies, scope):
+        current_user = await self.load_user(session, cookies)
+        if not current_user.is_authenticated:
+            return Response({"message": "Login required."}, 403)
+        count = await session.scalar(
+            select(func.count(Notification.id)).filter_by(
+                receiver_id=current_user.id, is_read=False
+            )
+        )
+        return Response({"count": count})
+
+    async def get_state(self, session, adapter, cookies, scope):
+        user_ids, photo_ids = requested_ids(self.query_args(scope))
+        if len(user_ids) + len(photo_ids) > self.app.config["AJAX_STATE_MAX_IDS"]:
+            return Response({"message": "Too many ids."}, 400)
+        current_user = await self.load_user(session, cookies)
+        viewer_id = current_user.id if current_user.is_authenticated else None
+        users = photos = {}
+        if user_ids:
+            users = by_id(await session.execute(users_state(user_ids, viewer_id)))
+        if photo_ids:
+            photos = by_id(await session.execute(photos_state(photo_ids, viewer_id)))
+        return Response({"users": users, "photos": photos})
+
+
+def create_asgi_app(config_name="production"):
+    from app import create_app
+
+    return AsyncAjax(create_app(config_name))
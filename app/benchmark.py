@@ -0,0 +1,482 @@
+import asyncio
+import io
+import json
+import multiprocessing
+import random
+import shutil
+import socket
+import subprocess
+import sys
+from http.client import HTTPConnection
+from pathlib import Path
+from statistics import median
+from threading import Thread
+from time import perf_counter, sleep
+from uuid import uuid4
+
+from flask import current_app
+from PIL import Image
+from sqlalchemy import event, select
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from app.extensions import db, whooshee
+
+SCALES = {
+    "small": dict(
+        user=1000, follow=10, photo=5000, tag=200, collect=10000, comment=20000
+    ),
+    "medium": dict(
+        user=10000, follow=20, photo=50000, tag=1000, collect=100000, comment=200000
+    ),
+    "large": dict(
+        user=100000,
+        follow=20,
+        photo=500000,
+        tag=5000,
+        collect=1000000,
+        comment=2000000,
+    ),
+}
+
+
+def seed(scale, seed=42):
+    from app.fake import (
+        bulk_fake_collect,
+        bulk_fake_comment,
+        bulk_fake_follow,
+        bulk_fake_photo,
+        bulk_fake_tag,
+        bulk_fake_user,
+        fake_admin,
+        faker,
+    )
+    from app.models import Role
+
+    params = SCALES[scale]
+    random.seed(seed)
+    faker.seed_instance(seed)
+    current_app.config["AVATARS_SAVE_PATH"].mkdir(parents=True, exist_ok=True)
+    db.drop_all()
+    db.create_all()
+    Role.init_roles()
+    fake_admin()
+    bulk_fake_user(params["user"])
+    bulk_fake_follow(params["follow"])
+    bulk_fake_tag(params["tag"])
+    bulk_fake_photo(params["photo"], images=8)
+    bulk_fake_collect(params["collect"])
+    bulk_fake_comment(params["comment"])
+    shutil.rmtree(current_app.config["WHOOSHEE_DIR"], ignore_errors=True)
+    current_app.extensions["whooshee"]["whoosheers_indexes"].clear()
+    whooshee.reindex()
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def _upload_body():
+    image = io.BytesIO()
+    Image.new(mode="RGB", size=(1200, 900), color=(200, 180, 160)).save(image, "JPEG")
+    boundary = uuid4().hex
+    body = b"".join(
+        [
+            f"--{boundary}\r\n".encode(),
+            (
+                b'Content-Disposition: form-data; name="file"; '
+                b'filename="benchmark.jpg"\r\n'
+            ),
+            b"Content-Type: image/jpeg\r\n\r\n",
+            image.getvalue(),
+            f"\r\n--{boundary}--\r\n".encode(),
+        ]
+    )
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def routes():
+    from app.models import Photo, Tag, User
+
+    photo_ids = db.session.scalars(select(Photo.id).order_by(Photo.id).limit(100)).all()
+    users = db.session.execute(
+        select(User.id, User.username).order_by(User.id).limit(100)
+    ).all()
+    tags = db.session.scalars(select(Tag.id).order_by(Tag.id).limit(100)).all()
+    words = [
+        word
+        for description in db.session.scalars(
+            select(Photo.description).order_by(Photo.id).limit(100)
+        )
+        for word in description.split()[:1]
+        if len(word) >= 3
+    ]
+
+    def cycle(items, format):
+        return lambda i: format(items[i % len(items)])
+
+    body, content_type = _upload_body()
+    return [
+        ("main.index", "GET", lambda i: "/", None),
+        ("main.explore", "GET", lambda i: "/explore", None),
+        ("main.show_photo", "GET", cycle(photo_ids, lambda id: f"/photo/{id}"), None),
+        ("main.show_tag", "GET", cycle(tags, lambda id: f"/tag/{id}"), None),
+        (
+            "main.search",
+            "GET",
+            cycle(words, lambda word: f"/search?q={word}"),
+            None,
+        ),
+        (
+            "user.index",
+            "GET",
+            cycle(users, lambda user: f"/user/{user.username}"),
+            None,
+        ),
+        (
+            "ajax.get_profile",
+            "GET",
+            cycle(users, lambda user: f"/ajax/profile/{user.id}"),
+            None,
+        ),
+        (
+            "ajax.followers_count",
+            "GET",
+            cycle(users, lambda user: f"/ajax/followers-count/{user.id}"),
+            None,
+        ),
+        (
+            "ajax.collectors_count",
+            "GET",
+            cycle(photo_ids, lambda id: f"/ajax/collectors-count/{id}"),
+            None,
+        ),
+        (
+            "ajax.notifications_count",
+            "GET",
+            lambda i: "/ajax/notifications-count",
+            None,
+        ),
+        ("main.upload", "POST", lambda i: "/upload", (body, content_type)),
+    ]
+
+
+def _summary(latencies, elapsed):
+    latencies = sorted(latencies)
+
+    def percentile(percent):
+        index = min(len(latencies) - 1, len(latencies) * percent // 100)
+        return round(latencies[index] * 1000, 2)
+
+    return dict(
+        p50=percentile(50),
+        p95=percentile(95),
+        p99=percentile(99),
+        rps=round(len(latencies) / elapsed, 1),
+    )
+
+
+def login(client):
+    client.post(
+        "/auth/login",
+        data=dict(email=current_app.config["ADMIN_EMAIL"], password="sunny"),
+        headers={"Referer": "/"},
+    )
+    return client.get_cookie("session").value
+
+
+def run_client(client, route, requests, warmup=5):
+    name, method, path, upload = route
+    statements = []
+
+    def count(*args):
+        statements.append(1)
+
+    def request(i):
+        if upload is None:
+            response = client.open(path(i), method=method)
+        else:
+            body, content_type = upload
+            response = client.open(
+                path(i), method=method, data=body, content_type=content_type
+            )
+        if response.status_code >= 400:
+            raise RuntimeError(f"{name} returned {response.status_code}")
+
+    for i in range(warmup):
+        request(i)
+    event.listen(db.engine, "before_cursor_execute", count)
+    latencies = []
+    start = perf_counter()
+    try:
+        for i in range(requests):
+            before = perf_counter()
+            request(i)
+            latencies.append(perf_counter() - before)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count)
+    elapsed = perf_counter() - start
+    return dict(
+        _summary(latencies, elapsed), queries=round(len(statements) / requests, 1)
+    )
+
+
+def run_server(port, cookie, route, requests, concurrency):
+    name, method, path, upload = route
+    latencies = []
+    errors = []
+
+    def worker(offset):
+        connection = HTTPConnection("127.0.0.1", port)
+        for i in range(offset, requests, concurrency):
+            headers = {"Cookie": f"session={cookie}"}
+            body = None
+            if upload is not None:
+                body, headers["Content-Type"] = upload
+            before = perf_counter()
+            connection.request(method, path(i), body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            latencies.append(perf_counter() - before)
+            if response.status >= 400:
+                errors.append(response.status)
+            if response.will_close:
+                connection.close()
+                connection = HTTPConnection("127.0.0.1", port)
+        connection.close()
+
+    threads = [Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    start = perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = perf_counter() - start
+    if errors:
+        raise RuntimeError(f"{name} returned {errors[0]}")
+    return _summary(latencies, elapsed)
+
+
+def run(app, requests=50, concurrency=4):
+    results = {}
+    with app.app_context():
+        client = app.test_client()
+        cookie = login(client)
+        for route in routes():
+            results[route[0]] = dict(client=run_client(client, route, requests))
+
+        server = make_server(
+            "127.0.0.1", 0, app, threaded=True, request_handler=QuietRequestHandler
+        )
+        thread = Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            for route in routes():
+                results[route[0]]["server"] = run_server(
+                    server.server_port, cookie, route, requests, concurrency
+                )
+        finally:
+            server.shutdown()
+            thread.join()
+    return results
+
+
+def compare(results, baseline, threshold=0.25):
+    regressions = []
+    for scale, scale_results in results.items():
+        for name, modes in scale_results.items():
+            for mode, metrics in modes.items():
+                base = baseline.get(scale, {}).get(name, {}).get(mode)
+                if base is None:
+                    continue
+                if metrics["p95"] > base["p95"] * (1 + threshold):
+                    regressions.append(
+                        f"{scale} {name} ({mode}): p95 {base['p95']}ms -> "
+                        f"{metrics['p95']}ms"
+                    )
+                if metrics.get("queries", 0) > base.get("queries", 0):
+                    regressions.append(
+                        f"{scale} {name} ({mode}): {base['queries']} -> "
+                        f"{metrics['queries']} queries"
+                    )
+    return regressions
+
+
+STARTUP_SCRIPT = """
+import json
+import sys
+from time import perf_counter, sleep
+
+start = perf_counter()
+from app import create_app
+
+options = json.loads(sys.argv[1])
+imported = perf_counter()
+app = create_app(options["config"])
+created = perf_counter()
+result = dict(
+    import_ms=(imported - start) * 1000,
+    create_ms=(created - imported) * 1000,
+    loaded=[name for name in options["watch"] if name in sys.modules],
+)
+if options["preload"]:
+    from app.startup import preload, warmup
+
+    preload(app)
+    warmup(app)
+    result["warmup_ms"] = (perf_counter() - created) * 1000
+client = app.test_client()
+for url in options["urls"]:
+    before = perf_counter()
+    client.get(url)
+    result[url] = (perf_counter() - before) * 1000
+result["ready_ms"] = (perf_counter() - start) * 1000
+print(json.dumps(result))
+"""
+STARTUP_WATCH = ("PIL.Image", "flask_avatars", "jwt", "faker", "whoosh.qparser")
+
+
+def startup_urls():
+    return [
+        path(0)
+        for name, method, path, upload in routes()
+        if method == "GET" and not name.startswith("ajax.")
+    ]
+
+
+def startup(config_name, urls, runs=5):
+    results = {}
+    for mode in ("cold", "preload"):
+        samples = []
+        for _ in range(runs):
+            options = dict(
+                config=config_name,
+                urls=urls,
+                watch=STARTUP_WATCH,
+                preload=mode == "preload",
+            )
+            output = subprocess.run(
+                [sys.executable, "-c", STARTUP_SCRIPT, json.dumps(options)],
+                cwd=Path(current_app.root_path).parent,
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout
+            samples.append(json.loads(output.splitlines()[-1]))
+        results[mode] = {
+            key: round(median(sample[key] for sample in samples), 1)
+            for key in samples[0]
+            if key != "loaded"
+        } | dict(loaded=samples[0]["loaded"])
+    return results
+
+
+def compare_startup(results, baseline, threshold=0.25):
+    regressions = []
+    for mode, metrics in results.items():
+        for key, value in metrics.items():
+            base = baseline.get(mode, {}).get(key)
+            if key == "loaded":
+                added = sorted(set(value) - set(base or value))
+                if added:
+                    regressions.append(f"{mode}: now imports {', '.join(added)}")
+            elif base is not None and value > base * (1 + threshold):
+                regressions.append(f"{mode} {key}: {base}ms -> {value}ms")
+    return regressions
+
+
+async def _fetch(reader, writer, path, cookie):
+    writer.write(
+        f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n"
+        f"Cookie: session={cookie}\r\n\r\n".encode()
+    )
+    status_line = await reader.readline()
+    headers = {}
+    while (line := await reader.readline()) not in (b"\r\n", b""):
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip().lower()
+    await reader.readexactly(int(headers.get("content-length", 0)))
+    keep_alive = headers.get("connection") != "close" and b"HTTP/1.1" in status_line
+    return int(status_line.split()[1]), keep_alive
+
+
+async def _load(port, cookie, path, requests, concurrency):
+    latencies = []
+    errors = []
+
+    async def worker(offset):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        for i in range(offset, requests, concurrency):
+            before = perf_counter()
+            status, keep_alive = await _fetch(reader, writer, path(i), cookie)
+            latencies.append(perf_counter() - before)
+            if status >= 400:
+                errors.append(status)
+            if not keep_alive:
+                writer.close()
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.close()
+
+    start = perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return latencies, errors, perf_counter() - start
+
+
+def _serve(mode, port):
+    from app import create_app
+
+    app = create_app("benchmark")
+    if mode == "sync":
+        make_server(
+            "127.0.0.1", port, app, threaded=True, request_handler=QuietRequestHandler
+        ).serve_forever()
+    else:
+        import uvicorn
+
+        from app.asgi import AsyncAjax
+
+        uvicorn.run(AsyncAjax(app), host="127.0.0.1", port=port, log_level="warning")
+
+
+def _start_server(mode, timeout=30):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    process = multiprocessing.get_context("spawn").Process(
+        target=_serve, args=(mode, port), daemon=True
+    )
+    process.start()
+    deadline = perf_counter() + timeout
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port)).close()
+            return port, process
+        except ConnectionRefusedError:
+            if not process.is_alive() or perf_counter() > deadline:
+                process.terminate()
+                raise RuntimeError(f"The {mode} server failed to start.") from None
+            sleep(0.1)
+
+
+def run_async(app, requests=1000, concurrency=(10, 100)):
+    results = {}
+    with app.app_context():
+        cookie = login(app.test_client())
+        ajax_routes = [route for route in routes() if route[0].startswith("ajax.")]
+    for mode in ("sync", "async"):
+        port, process = _start_server(mode)
+        try:
+            for name, method, path, upload in ajax_routes:
+                for clients in concurrency:
+                    latencies, errors, elapsed = asyncio.run(
+                        _load(port, cookie, path, requests, clients)
+                    )
+                    if errors:
+                        raise RuntimeError(f"{name} ({mode}) returned {errors[0]}")
+                    results.setdefault(name, {})[f"{mode}@{clients}"] = _summary(
+                        latencies, elapsed
+                    )
+        finally:
+            process.terminate()
+            process.join()
+    return results
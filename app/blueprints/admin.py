@@ -1,3 +1,5 @@
+from time import time
+
 from flask import (
     Blueprint,
     current_app,
@@ -8,12 +10,30 @@ from flask import (
     url_for,
 )
 from flask_login import login_required
-from sqlalchemy import func, select
+from sqlalchemy import select
 
 from app.decorators import admin_required, permission_required
 from app.extensions import db
 from app.forms.admin import EditProfileAdminForm
-from app.models import Comment, Permission, Photo, Role, Tag, User
+from app.instrumentation import summarize
+from app.models import Comment, Permission, Photo, RequestProfile, Tag, User, roles
+from app.moderation import (
+    block_users,
+    delete_comments,
+    delete_photos,
+    filter_comments,
+    filter_photos,
+    filter_users,
+    lock_users,
+)
+from app.profiler import (
+    PROFILER_HEADER,
+    current_target,
+    hottest,
+    start_profiling,
+    stop_profiling,
+)
+from app.stats import get_stats
 from app.utils import redirect_back
 
 admin = Blueprint("admin", __name__)
@@ -28,39 +48,110 @@ def before_admin_request():
 
 @admin.get("/")
 def index():
-    user_count = db.session.scalar(select(func.count(User.id)))
-    locked_user_count = db.session.scalar(
-        select(func.count(User.id)).filter_by(locked=True)
+    stats = get_stats()
+    return render_template(
+        "admin/index.html",
+        stats=stats["current"],
+        previous=stats["previous"],
+        history=stats["history"],
     )
-    blocked_user_count = db.session.scalar(
-        select(func.count(User.id)).filter_by(active=True)
+
+
+@admin.get("/sql")
+@admin_required
+def sql_profile():
+    window = request.args.get("window", type=int)
+    return render_template("admin/sql.html", summary=summarize(window))
+
+
+@admin.get("/profiles")
+@admin_required
+def manage_profile():
+    page = request.args.get("page", 1, type=int)
+    pagination = db.paginate(
+        select(RequestProfile).order_by(RequestProfile.created_at.desc()),
+        page=page,
+        per_page=current_app.config["MANAGE_PROFILE_PER_PAGE"],
     )
-    photo_count = db.session.scalar(select(func.count(Photo.id)))
-    reported_photo_count = db.session.scalar(
-        select(func.count(Photo.id)).filter(Photo.flag > 0)
+    endpoints = sorted({rule.endpoint for rule in current_app.url_map.iter_rules()})
+    return render_template(
+        "admin/manage_profile.html",
+        pagination=pagination,
+        profiles=pagination.items,
+        target=current_target(),
+        endpoints=endpoints,
+        header=PROFILER_HEADER,
+        now=time(),
     )
-    tag_count = db.session.scalar(select(func.count(Tag.id)))
-    comment_count = db.session.scalar(select(func.count(Comment.id)))
-    reported_comment_count = db.session.scalar(
-        select(func.count(Comment.id)).filter(Comment.flag > 0)
+
+
+@admin.post("/profiles/start")
+@admin_required
+def start_profile():
+    user_id = None
+    username = request.form.get("username", "").strip()
+    if username:
+        user_id = db.session.scalar(select(User.id).filter_by(username=username))
+        if user_id is None:
+            flash("User not found.", "warning")
+            return redirect(url_for(".manage_profile"))
+    endpoint = request.form.get("endpoint", "").strip()
+    header = "header" in request.form
+    if not (endpoint or user_id or header):
+        flash("Choose an endpoint, a user or the header to match.", "warning")
+        return redirect(url_for(".manage_profile"))
+    start_profiling(
+        endpoint=endpoint,
+        user_id=user_id,
+        header=header,
+        limit=max(1, request.form.get("limit", 10, type=int)),
+        minutes=max(1, request.form.get("minutes", 10, type=int)),
     )
+    flash("Profiling started.", "success")
+    return redirect(url_for(".manage_profile"))
+
+
+@admin.post("/profiles/stop")
+@admin_required
+def stop_profile():
+    stop_profiling()
+    flash("Profiling stopped.", "info")
+    return redirect(url_for(".manage_profile"))
+
+
+@admin.get("/profiles/<int:id>")
+@admin_required
+def show_profile(id):
+    profile = db.get_or_404(RequestProfile, id)
     return render_template(
-        "admin/index.html",
-        user_count=user_count,
-        photo_count=photo_count,
-        tag_count=tag_count,
-        comment_count=comment_count,
-        locked_user_count=locked_user_count,
-        blocked_user_count=blocked_user_count,
-        reported_comment_count=reported_comment_count,
-        reported_photo_count=reported_photo_count,
+        "admin/profile.html", profile=profile, functions=hottest(profile.stacks)
     )
 
 
+@admin.get("/profiles/<int:id>.txt")
+@admin_required
+def download_profile(id):
+    profile = db.get_or_404(RequestProfile, id)
+    return profile.stacks, {
+        "Content-Type": "text/plain; charset=utf-8",
+        "Content-Disposition": f"attachment; filename=profile-{id}.txt",
+    }
+
+
+@admin.post("/profiles/<int:id>/delete")
+@admin_required
+def delete_profile(id):
+    profile = db.get_or_404(RequestProfile, id)
+    db.session.delete(profile)
+    db.session.commit()
+    flash("Profile deleted.", "info")
+    return redirect(url_for(".manage_profile"))
+
+
 @admin.post("/lock/user/<int:id>")
 def lock_user(id):
     user = db.get_or_404(User, id)
-    if user.role.name in []:
+    if user.role_name in []:
         flash("Permission denied.", "warning")
     else:
         user.lock()
@@ -83,10 +174,10 @@ def edit_profile_admin(id):
     form = EditProfileAdminForm(user=user)
     if form.validate_on_submit():
         user.name = form.name.data
-        role = db.session.get(Role, form.role.data)
+        role = roles.get(form.role.data)
         if role.name == "Locked":
             user.lock()
-        user.role = role
+        user.role_id = role.id
         user.bio = form.bio.data
         user.website = form.website.data
         user.location = form.location.data
@@ -112,7 +203,7 @@ def edit_profile_admin(id):
 @admin.post("/block/user/<int:id>")
 def block_user(id):
     user = db.get_or_404(User, id)
-    if user.role.name in ["Administrator", "Moderator"]:
+    if user.role_name in ["Admin", "Moderator"]:
         flash("Permission denied.", "warning")
     else:
         user.block()
@@ -142,17 +233,15 @@ def manage_user():
     filter = request.args.get("filter", "all")
     page = request.args.get("page", 1, type=int)
     per_page = current_app.config["MANAGE_USER_PER_PAGE"]
-    administrator = db.session.scalar(select(Role).filter_by(name="Administrator"))
-    moderator = db.session.scalar(select(Role).filter_by(name="Moderator"))
 
     if filter == "locked":
         filtered_users = select(User).filter_by(locked=True)
     elif filter == "blocked":
         filtered_users = select(User).filter_by(active=False)
     elif filter == "administrator":
-        filtered_users = select(User).filter_by(role=administrator)
+        filtered_users = select(User).filter_by(role_id=roles.get_id("Admin"))
     elif filter == "moderator":
-        filtered_users = select(User).filter_by(role=moderator)
+        filtered_users = select(User).filter_by(role_id=roles.get_id("Moderator"))
     else:
         filtered_users = select(User)
     pagination = db.paginate(
@@ -178,12 +267,14 @@ def manage_photo(order="by_flag"):
         order_rule = "time"
     else:
         pagination = db.paginate(
-            select(Photo).order_by(Photo.flag.desc()),
+            select(Photo)
+            .filter(Photo.flag > 0)
+            .order_by(Photo.flag.desc(), Photo.id.desc()),
             page=page,
             per_page=per_page,
             error_out=False,
         )
-    if page > pagination.pages:
+    if pagination.pages and page > pagination.pages:
         return redirect(
             url_for(".manage_photo", page=pagination.pages, order_rule=order_rule)
         )
@@ -223,12 +314,14 @@ def manage_comment(order="by_flag"):
         order_rule = "time"
     else:
         pagination = db.paginate(
-            select(Comment).order_by(Comment.flag.desc()),
+            select(Comment)
+            .filter(Comment.flag > 0)
+            .order_by(Comment.flag.desc(), Comment.id.desc()),
             page=page,
             per_page=per_page,
             error_out=False,
         )
-    if page > pagination.pages:
+    if pagination.pages and page > pagination.pages:
         return redirect(url_for(".manage_comment", page=pagination.pages))
     comments = pagination.items
     return render_template(
@@ -241,7 +334,7 @@ def manage_comment(order="by_flag"):
 
 @admin.post("/delete/photo/<int:id>")
 def delete_photo(id):
-    photo = db.get_or_404(Photo.id)
+    photo = db.get_or_404(Photo, id)
     db.session.delete(photo)
     db.session.commit()
     flash("Photo deleted.", "info")
@@ -255,3 +348,55 @@ def delete_comment(id):
     db.session.commit()
     flash("Comment deleted.", "info")
     return redirect_back()
+
+
+@admin.post("/bulk/photo/delete")
+def bulk_delete_photos():
+    query = filter_photos(
+        ids=request.form.getlist("ids", type=int),
+        author=request.form.get("author", "").strip(),
+        min_flag=request.form.get("min_flag", type=int),
+    )
+    if query is None:
+        flash("No photos selected.", "warning")
+    else:
+        count = delete_photos(query)
+        flash(f"{count} photos deleted.", "info")
+    return redirect_back()
+
+
+@admin.post("/bulk/comment/delete")
+def bulk_delete_comments():
+    query = filter_comments(
+        ids=request.form.getlist("ids", type=int),
+        author=request.form.get("author", "").strip(),
+        min_flag=request.form.get("min_flag", type=int),
+    )
+    if query is None:
+        flash("No comments selected.", "warning")
+    else:
+        count = delete_comments(query)
+        flash(f"{count} comments deleted.", "info")
+    return redirect_back()
+
+
+@admin.post("/bulk/user/lock")
+def bulk_lock_users():
+    query = filter_users(ids=request.form.getlist("ids", type=int))
+    if query is None:
+        flash("No users selected.", "warning")
+    else:
+        count = lock_users(query)
+        flash(f"{count} accounts locked.", "info")
+    return redirect_back()
+
+
+@admin.post("/bulk/user/block")
+def bulk_block_users():
+    query = filter_users(ids=request.form.getlist("ids", type=int))
+    if query is None:
+        flash("No users selected.", "warning")
+    else:
+        count = block_users(query)
+        flash(f"{count} accounts blocked.", "info")
+    return redirect_back()
@@ -1,18 +1,30 @@
-from flask import Blueprint, abort, render_template
+from flask import Blueprint, abort, current_app, request
 from flask_login import current_user
 from sqlalchemy import func, select
 
 from app.extensions import db
 from app.models import Permission, Photo, User
 from app.notifications import push_collect_notification
+from app.profiles import load_popups
+from app.state import by_id, photos_state, requested_ids, users_state
 
 ajax = Blueprint("ajax", __name__)
 
 
 @ajax.get("/profile/<int:id>")
 def get_profile(id):
-    user = db.get_or_404(User, id)
-    return render_template("main/profile_popup.html", user=user)
+    popups = load_popups([id])
+    if id not in popups:
+        abort(404)
+    return popups[id]
+
+
+@ajax.get("/profiles")
+def get_profiles():
+    ids = list(dict.fromkeys(request.args.getlist("id", type=int)))
+    if len(ids) > current_app.config["AJAX_STATE_MAX_IDS"]:
+        return {"message": "Too many ids."}, 400
+    return load_popups(ids) if ids else {}
 
 
 @ajax.post("/follow/<username>")
@@ -24,6 +36,8 @@ def follow(username):
     if not current_user.can(Permission.FOLLOW):
         return {"message": "No permission."}, 403
     user = db.session.scalar(select(User).filter_by(username=username)) or abort(404)
+    if user == current_user:
+        return {"message": "Can't follow yourself."}, 400
     if current_user.is_following(user):
         return {"message": "Already followed."}, 400
     current_user.follow(user)
@@ -91,3 +105,17 @@ def notifications_count():
         .with_only_columns(func.count())
     )
     return {"count": count}
+
+
+@ajax.get("/state")
+def get_state():
+    user_ids, photo_ids = requested_ids(request.args)
+    if len(user_ids) + len(photo_ids) > current_app.config["AJAX_STATE_MAX_IDS"]:
+        return {"message": "Too many ids."}, 400
+    viewer_id = current_user.id if current_user.is_authenticated else None
+    users = photos = {}
+    if user_ids:
+        users = by_id(db.session.execute(users_state(user_ids, viewer_id)))
+    if photo_ids:
+        photos = by_id(db.session.execute(photos_state(photo_ids, viewer_id)))
+    return {"users": users, "photos": photos}
@@ -1,5 +1,5 @@
 import click
-from flask import Blueprint
+from flask import Blueprint, current_app
 
 from app.extensions import db, whooshee
 
@@ -25,6 +25,25 @@ def initmail():
     )
 
 
+@commands.cli.command("compile-templates")
+def compile_templates():
+    """Precompile all templates into the bytecode cache."""
+    from time import perf_counter
+
+    from app.startup import compile_templates
+
+    bytecode_cache = current_app.jinja_env.bytecode_cache
+    if bytecode_cache is None:
+        raise click.ClickException("TEMPLATE_CACHE_DIR is not set.")
+    bytecode_cache.clear()
+    start = perf_counter()
+    names = compile_templates(current_app)
+    print(
+        f"Compiled {len(names)} templates in {perf_counter() - start:.2f}s "
+        f"to {current_app.config['TEMPLATE_CACHE_DIR']}."
+    )
+
+
 @commands.cli.command()
 def reindex():
     """Whooshee reindex."""
@@ -32,6 +51,231 @@ def reindex():
     print("Whooshee reindex completed.")
 
 
+@commands.cli.command()
+@click.option(
+    "--mode",
+    default="TRUNCATE",
+    type=click.Choice(["PASSIVE", "FULL", "RESTART", "TRUNCATE"]),
+    help="Checkpoint mode, default is TRUNCATE.",
+)
+def checkpoint(mode):
+    """Checkpoint the SQLite write-ahead log."""
+    from app.sqlite import checkpoint
+
+    busy, log, checkpointed = checkpoint(db.engine, mode)
+    print(f"Checkpointed {checkpointed}/{log} frames (busy={busy}).")
+
+
+@commands.cli.command("benchmark-sqlite")
+@click.option("--readers", default=8, help="Reader threads, default is 8.")
+@click.option("--writers", default=2, help="Writer threads, default is 2.")
+@click.option("--duration", default=5.0, help="Seconds per profile, default is 5.")
+@click.option(
+    "--hold", default=10, help="Milliseconds each write transaction stays open."
+)
+def benchmark_sqlite(readers, writers, duration, hold):
+    """Benchmark concurrent reads and writes under each SQLite profile."""
+    from app.config import config
+    from app.sqlite import run_benchmark
+
+    if db.engine.dialect.name != "sqlite" or not db.engine.url.database:
+        raise click.UsageError("A file based SQLite database is required.")
+    wal = config["production"].SQLITE_PRAGMAS
+    profiles = {
+        "rollback": ({"journal_mode": "DELETE", "busy_timeout": 5000}, False),
+        "wal": (wal, False),
+        "wal+single-writer": (wal, True),
+    }
+    for name, (pragmas, single_writer) in profiles.items():
+        result = run_benchmark(
+            current_app._get_current_object(),
+            db.engine.url.database,
+            pragmas,
+            single_writer,
+            readers,
+            writers,
+            duration,
+            hold / 1000,
+        )
+        if result is None:
+            raise click.UsageError("No photos to benchmark, run flask fake first.")
+        print(
+            f"{name}: {result['reads']:.0f} reads/s "
+            f"(p50 {result['read_p50']:.1f}ms, p95 {result['read_p95']:.1f}ms), "
+            f"{result['writes']:.0f} writes/s "
+            f"(p50 {result['write_p50']:.1f}ms, p95 {result['write_p95']:.1f}ms), "
+            f"{result['errors']} errors"
+        )
+
+
+@commands.cli.command()
+@click.option(
+    "--scale",
+    "scales",
+    multiple=True,
+    default=["small"],
+    type=click.Choice(["small", "medium", "large"]),
+    help="Dataset size, repeatable, default is small.",
+)
+@click.option("--requests", default=50, help="Requests per route, default is 50.")
+@click.option("--concurrency", default=4, help="Concurrent server clients.")
+@click.option("--seed", default=42, help="Random seed, default is 42.")
+@click.option("--output", type=click.Path(), help="Write results to a JSON file.")
+@click.option(
+    "--baseline", type=click.Path(exists=True), help="JSON results to compare with."
+)
+@click.option("--threshold", default=0.25, help="Allowed p95 growth, default 0.25.")
+def benchmark(scales, requests, concurrency, seed, output, baseline, threshold):
+    """Benchmark the main routes against a seeded dataset."""
+    import json
+
+    from app import create_app
+    from app.benchmark import compare, run
+    from app.benchmark import seed as seed_data
+
+    app = create_app("benchmark")
+    results = {}
+    for scale in scales:
+        with app.app_context():
+            seed_data(scale, seed)
+        results[scale] = run(app, requests, concurrency)
+        print(f"Scale {scale}:")
+        for name, modes in results[scale].items():
+            for mode, metrics in modes.items():
+                queries = (
+                    f"{metrics['queries']:>6} queries" if "queries" in metrics else ""
+                )
+                print(
+                    f"  {name:<26} {mode:<7} p50 {metrics['p50']:>8.2f}ms "
+                    f"p95 {metrics['p95']:>8.2f}ms p99 {metrics['p99']:>8.2f}ms "
+                    f"{metrics['rps']:>8.1f} req/s {queries}"
+                )
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {output}.")
+    if baseline:
+        with open(baseline) as f:
+            regressions = compare(results, json.load(f), threshold)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            raise click.ClickException(f"{len(regressions)} regressions found.")
+        print("No regressions against the baseline.")
+
+
+@commands.cli.command("benchmark-startup")
+@click.option("--url", "urls", multiple=True, help="First requests, repeatable.")
+@click.option("--runs", default=5, help="Processes started per mode, default is 5.")
+@click.option("--output", type=click.Path(), help="Write results to a JSON file.")
+@click.option(
+    "--baseline", type=click.Path(exists=True), help="JSON results to compare with."
+)
+@click.option("--threshold", default=0.25, help="Allowed growth, default 0.25.")
+def benchmark_startup(urls, runs, output, baseline, threshold):
+    """Measure import time and time to first response of fresh workers."""
+    import json
+
+    from sqlalchemy import inspect
+
+    from app import create_app
+    from app.benchmark import compare_startup, seed, startup, startup_urls
+
+    app = create_app("benchmark")
+    with app.app_context():
+        if not inspect(db.engine).has_table("user"):
+            seed("small")
+        urls = list(urls) or startup_urls()
+        results = startup("benchmark", urls, runs)
+    for mode, metrics in results.items():
+        print(f"{mode}:")
+        for key, value in metrics.items():
+            if key == "loaded":
+                print(f"  {'heavy modules':<26} {', '.join(value) or '-'}")
+            else:
+                print(f"  {key:<26} {value:>8.1f}ms")
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {output}.")
+    if baseline:
+        with open(baseline) as f:
+            regressions = compare_startup(results, json.load(f), threshold)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            raise click.ClickException(f"{len(regressions)} regressions found.")
+        print("No regressions against the baseline.")
+
+
+@commands.cli.command("benchmark-async")
+@click.option("--requests", default=1000, help="Requests per route, default is 1000.")
+@click.option(
+    "--concurrency",
+    multiple=True,
+    type=int,
+    default=[10, 100],
+    help="Concurrent connections, repeatable, default is 10 and 100.",
+)
+def benchmark_async(requests, concurrency):
+    """Compare the sync and async ajax endpoints under concurrent load."""
+    from sqlalchemy import inspect
+
+    from app import create_app
+    from app.benchmark import run_async, seed
+
+    app = create_app("benchmark")
+    with app.app_context():
+        if not inspect(db.engine).has_table("user"):
+            seed("small")
+    for name, modes in run_async(app, requests, concurrency).items():
+        for mode, metrics in modes.items():
+            print(
+                f"  {name:<26} {mode:<10} p50 {metrics['p50']:>8.2f}ms "
+                f"p95 {metrics['p95']:>8.2f}ms p99 {metrics['p99']:>8.2f}ms "
+                f"{metrics['rps']:>8.1f} req/s"
+            )
+
+
+@commands.cli.command("replica-status")
+def replica_status():
+    """Check replica health and lag."""
+    from app.replicas import replicas
+
+    replicas.beat(db.engine)
+    status = replicas.check(db.engines)
+    if not status:
+        print("No replicas configured.")
+    for key, replica in status.items():
+        lag = (
+            "unreachable" if replica["lag"] is None else f"{replica['lag']:.1f}s behind"
+        )
+        state = "healthy" if replica["healthy"] else "unhealthy"
+        print(f"{key}: {state}, {lag}")
+
+
+@commands.cli.command("sync-replica")
+@click.argument("key")
+def sync_replica(key):
+    """Copy the SQLite primary into a replica bind."""
+    from app.replicas import replicas, sync_replica
+
+    if key not in current_app.config["REPLICA_BINDS"]:
+        raise click.BadParameter(f"Unknown replica {key}.")
+    replicas.beat(db.engine)
+    sync_replica(db.engine.url.database, db.engines[key].url.database)
+    print(f"Replica {key} synced.")
+
+
+@commands.cli.command("snapshot-stats")
+def snapshot_stats():
+    """Record a dashboard statistics snapshot."""
+    from app.stats import record_snapshot
+
+    snapshot = record_snapshot()
+    print(f"Statistics snapshot recorded at {snapshot.created_at}.")
+
+
 @commands.cli.command()
 @click.option("--user", default=10, help="Quantity of users, default is 10.")
 @click.option("--follow", default=30, help="Quantity of follows, default is 30.")
@@ -78,3 +322,170 @@ def fake(user, follow, photo, tag, collect, comment):
 
     fake_comment(comment)
     print(f"Generated {comment} comments.")
+
+
+@commands.cli.command("fake-bulk")
+@click.option("--user", default=100000, help="Quantity of users, default is 100000.")
+@click.option("--follow", default=20, help="Average follows per user, default is 20.")
+@click.option("--photo", default=100000, help="Quantity of photos, default is 100000.")
+@click.option("--tag", default=1000, help="Quantity of tags, default is 1000.")
+@click.option(
+    "--collect", default=200000, help="Quantity of collects, default is 200000."
+)
+@click.option(
+    "--comment", default=500000, help="Quantity of comments, default is 500000."
+)
+@click.option("--images", default=64, help="Distinct placeholder images.")
+@click.option("--workers", type=int, help="Processes rendering placeholder images.")
+@click.option("--chunk-size", default=10000, help="Rows per transaction.")
+def fake_bulk(user, follow, photo, tag, collect, comment, images, workers, chunk_size):
+    """Generate a large fake dataset for load testing."""
+    from time import perf_counter
+
+    from app.fake import (
+        bulk_fake_collect,
+        bulk_fake_comment,
+        bulk_fake_follow,
+        bulk_fake_photo,
+        bulk_fake_tag,
+        bulk_fake_user,
+        fake_admin,
+    )
+    from app.models import Role
+
+    db.drop_all()
+    db.create_all()
+    Role.init_roles()
+    fake_admin()
+
+    steps = [
+        ("users", lambda: bulk_fake_user(user, chunk_size, _print_progress("users"))),
+        (
+            "follows",
+            lambda: bulk_fake_follow(
+                follow, chunk_size=chunk_size, progress=_print_progress("follows")
+            ),
+        ),
+        ("tags", lambda: bulk_fake_tag(tag, chunk_size)),
+        (
+            "photos",
+            lambda: bulk_fake_photo(
+                photo, images, workers, chunk_size, _print_progress("photos")
+            ),
+        ),
+        (
+            "collects",
+            lambda: bulk_fake_collect(collect, chunk_size, _print_progress("collects")),
+        ),
+        (
+            "comments",
+            lambda: bulk_fake_comment(comment, chunk_size, _print_progress("comments")),
+        ),
+    ]
+    for noun, step in steps:
+        start = perf_counter()
+        count = step()
+        elapsed = perf_counter() - start
+        print(f"Generated {count} {noun} in {elapsed:.1f}s ({count / elapsed:.0f}/s).")
+    print("Run flask reindex to build the search index.")
+
+
+def _print_progress(noun):
+    def progress(done, total):
+        print(f"{done}/{total} {noun} processed.")
+
+    return progress
+
+
+@commands.cli.command("delete-photos")
+@click.option("--id", "ids", multiple=True, type=int, help="Photo id, repeatable.")
+@click.option("--author", help="Delete all photos by this username.")
+@click.option("--min-flag", type=int, help="Delete photos reported more than N times.")
+@click.option("--chunk-size", type=int, help="Rows per transaction.")
+def delete_photos(ids, author, min_flag, chunk_size):
+    """Delete photos in bulk."""
+    from app.moderation import delete_photos, filter_photos
+
+    query = filter_photos(ids=ids, author=author, min_flag=min_flag)
+    if query is None:
+        raise click.UsageError("Pass --id, --author or --min-flag.")
+    count = delete_photos(query, chunk_size, progress=_print_progress("photos"))
+    print(f"{count} photos deleted.")
+
+
+@commands.cli.command("delete-comments")
+@click.option("--id", "ids", multiple=True, type=int, help="Comment id, repeatable.")
+@click.option("--author", help="Delete all comments by this username.")
+@click.option(
+    "--min-flag", type=int, help="Delete comments reported more than N times."
+)
+@click.option("--chunk-size", type=int, help="Rows per transaction.")
+def delete_comments(ids, author, min_flag, chunk_size):
+    """Delete comments in bulk."""
+    from app.moderation import delete_comments, filter_comments
+
+    query = filter_comments(ids=ids, author=author, min_flag=min_flag)
+    if query is None:
+        raise click.UsageError("Pass --id, --author or --min-flag.")
+    count = delete_comments(query, chunk_size, progress=_print_progress("comments"))
+    print(f"{count} comments deleted.")
+
+
+@commands.cli.command("lock-users")
+@click.option("--id", "ids", multiple=True, type=int, required=True)
+@click.option("--chunk-size", type=int, help="Rows per transaction.")
+def lock_users(ids, chunk_size):
+    """Lock accounts in bulk."""
+    from app.moderation import filter_users, lock_users
+
+    count = lock_users(filter_users(ids), chunk_size, _print_progress("users"))
+    print(f"{count} accounts locked.")
+
+
+@commands.cli.command("block-users")
+@click.option("--id", "ids", multiple=True, type=int, required=True)
+@click.option("--chunk-size", type=int, help="Rows per transaction.")
+def block_users(ids, chunk_size):
+    """Block accounts in bulk."""
+    from app.moderation import block_users, filter_users
+
+    count = block_users(filter_users(ids), chunk_size, _print_progress("users"))
+    print(f"{count} accounts blocked.")
+
+
+@commands.cli.command("prune-notifications")
+@click.option("--days", type=int, help="Keep read notifications newer than N days.")
+@click.option("--chunk-size", type=int, help="Rows per transaction.")
+def prune_notifications(days, chunk_size):
+    """Delete read notifications older than the retention period."""
+    from app.notifications import prune_notifications
+
+    count = prune_notifications(days, chunk_size, _print_progress("notifications"))
+    print(f"{count} notifications pruned.")
+
+
+@commands.cli.command("upgrade-db")
+@click.option("--chunk-size", type=int, help="Rows per transaction.")
+def upgrade_db(chunk_size):
+    """Add new tables, columns and indexes to an existing database."""
+    from app.moderation import delete_self_follows
+    from app.notifications import migrate_notifications, notification_table_size
+    from app.schema import backfill_collections_count, upgrade_schema
+
+    added = upgrade_schema()
+    for table, columns in added.items():
+        if columns:
+            print(f"Added {', '.join(columns)} to {table}.")
+    count = backfill_collections_count(chunk_size, _print_progress("photos"))
+    print(f"{count} photo collection counts checked.")
+    count = delete_self_follows(chunk_size, _print_progress("self-follows"))
+    print(f"{count} self-follows removed.")
+    before = notification_table_size()
+    count = migrate_notifications(chunk_size, _print_progress("notifications"))
+    after = notification_table_size()
+    print(f"{count} notifications converted.")
+    if before:
+        print(
+            f"Notification table: {before} -> {after} bytes "
+            f"({(after - before) / before:+.0%})."
+        )
@@ -1,3 +1,5 @@
+from math import ceil
+
 from flask import (
     Blueprint,
     abort,
@@ -10,9 +12,9 @@ from flask import (
     url_for,
 )
 from flask_login import current_user, login_required
-from sqlalchemy import func, select
-from sqlalchemy.orm import with_parent
+from sqlalchemy import func, or_, select, tuple_, update
 
+from app.caching import anonymous_cached, get_or_set
 from app.decorators import confirm_required, permission_required
 from app.extensions import db
 from app.forms.main import CommentForm, DescriptionForm, TagForm
@@ -26,7 +28,10 @@ from app.models import (
     Tag,
     User,
 )
-from app.notifications import push_comment_notification
+from app.notifications import load_actors, push_comment_notification
+from app.replicas import read_from_replica
+from app.tags import add_tags, remove_tag
+from app.telemetry import UPLOADS
 from app.utils import (
     allowed_file,
     flash_errors,
@@ -47,8 +52,16 @@ def index():
         per_page = current_app.config["PHOTO_PER_PAGE"]
         pagination = db.paginate(
             select(Photo)
-            .join(Follow, Follow.followed_id == Photo.author_id)
-            .filter(Follow.follower_id == current_user.id)
+            .filter(
+                or_(
+                    Photo.author_id == current_user.id,
+                    Photo.author_id.in_(
+                        select(Follow.followed_id).filter_by(
+                            follower_id=current_user.id
+                        )
+                    ),
+                )
+            )
             .order_by(Photo.created_at.desc()),
             page=page,
             per_page=per_page,
@@ -67,12 +80,15 @@ def index():
 
 
 @main.get("/explore")
+@anonymous_cached
+@read_from_replica
 def explore():
     photos = db.session.scalars(select(Photo).order_by(func.random()).limit(10))
     return render_template("main/explore.html", photos=photos)
 
 
 @main.get("/search")
+@read_from_replica
 def search():
     q = request.args.get("q").strip()
     if not q:
@@ -128,6 +144,7 @@ def upload():
         )
         db.session.add(photo)
         db.session.commit()
+        UPLOADS.inc()
     return render_template("main/upload.html")
 
 
@@ -142,16 +159,26 @@ def get_image(filename):
 
 
 @main.get("/photo/<int:id>")
+@anonymous_cached
+@read_from_replica
 def show_photo(id):
     photo = db.get_or_404(Photo, id)
     page = request.args.get("page", 1, type=int)
     per_page = current_app.config["COMMENT_PER_PAGE"]
-    pagination = db.paginate(
-        select(Comment).filter_by(photo_id=photo.id).order_by(Comment.created_at.asc()),
-        page=page,
-        per_page=per_page,
+    timeout = current_app.config["PHOTO_CACHE_TIMEOUT"]
+    comments_count = get_or_set(
+        photo.cache_key("comments-count"),
+        lambda: db.session.scalar(
+            select(func.count(Comment.id)).filter_by(photo_id=photo.id)
+        ),
+        timeout,
+    )
+    author = photo.author
+    neighbors = get_or_set(
+        f"user:{author.id}:{author.version}:neighbors:{photo.id}",
+        lambda: photo.get_neighbors()._asdict(),
+        timeout,
     )
-    comments = pagination.items
     comment_form = CommentForm()
     tag_form = TagForm()
     description_form = DescriptionForm()
@@ -159,11 +186,20 @@ def show_photo(id):
     return render_template(
         "main/photo.html",
         photo=photo,
+        neighbors=neighbors,
         description_form=description_form,
         comment_form=comment_form,
         tag_form=tag_form,
-        pagination=pagination,
-        comments=comments,
+        page=page,
+        comments_count=comments_count,
+        comment_pages=ceil(comments_count / per_page),
+        load_comments=lambda: db.paginate(
+            select(Comment)
+            .filter_by(photo_id=photo.id)
+            .order_by(Comment.created_at.asc()),
+            page=page,
+            per_page=per_page,
+        ),
     )
 
 
@@ -173,9 +209,10 @@ def get_next_photo(id):
     next_photo = db.session.scalar(
         select(Photo)
         .filter(
-            with_parent(photo.author, User.photos), Photo.created_at < photo.created_at
+            Photo.author_id == photo.author_id,
+            tuple_(Photo.created_at, Photo.id) < (photo.created_at, photo.id),
         )
-        .order_by(Photo.created_at.desc())
+        .order_by(Photo.created_at.desc(), Photo.id.desc())
     )
     if next_photo is None:
         flash("This is already the last one.", "info")
@@ -189,9 +226,10 @@ def get_previous_photo(id):
     previous_photo = db.session.scalar(
         select(Photo)
         .filter(
-            with_parent(photo.author, User.photos), Photo.created_at > photo.created_at
+            Photo.author_id == photo.author_id,
+            tuple_(Photo.created_at, Photo.id) > (photo.created_at, photo.id),
         )
-        .order_by(Photo.created_at.asc())
+        .order_by(Photo.created_at.asc(), Photo.id.asc())
     )
     if previous_photo is None:
         flash("This is already the first one.", "info")
@@ -209,15 +247,16 @@ def delete_photo(id):
     db.session.commit()
     flash("Photo deleted.", "info")
     query = select(Photo).filter(Photo.author_id == photo.author_id)
+    position = tuple_(Photo.created_at, Photo.id)
     next_photo = db.session.scalar(
-        query.filter(Photo.created_at < photo.created_at).order_by(
-            Photo.created_at.desc()
+        query.filter(position < (photo.created_at, photo.id)).order_by(
+            Photo.created_at.desc(), Photo.id.desc()
         )
     )
     if next_photo is None:
         previous_photo = db.session.scalar(
-            query.filter(Photo.created_at > photo.created_at).order_by(
-                Photo.created_at.asc()
+            query.filter(position > (photo.created_at, photo.id)).order_by(
+                Photo.created_at.asc(), Photo.id.asc()
             )
         )
         if previous_photo is None:
@@ -231,9 +270,10 @@ def delete_photo(id):
 @confirm_required
 def report_photo(id):
     photo = db.get_or_404(Photo, id)
-    photo.flag += 1
-    db.session.commit()
-    flash("Photo reported.", "success")
+    if current_user.report(photo=photo):
+        flash("Photo reported.", "success")
+    else:
+        flash("Already reported.", "info")
     return redirect(url_for(".show_photo", id=photo.id))
 
 
@@ -260,15 +300,7 @@ def new_tag(id):
         abort(403)
     form = TagForm()
     if form.validate_on_submit():
-        for name in form.tag.data.split():
-            tag = db.session.scalar(select(Tag).filter_by(name=name))
-            if tag is None:
-                tag = Tag(name=name)
-                db.session.add(tag)
-                db.session.commit()
-            if tag not in photo.tags:
-                photo.tags.append(tag)
-                db.session.commit()
+        add_tags(photo, form.tag.data.split())
         flash("Tag added.", "success")
     flash_errors(form)
     return redirect(url_for(".show_photo", id=photo.id))
@@ -281,30 +313,26 @@ def delete_tag(photo_id, tag_id):
     tag = db.get_or_404(Tag, tag_id)
     if current_user != photo.author:
         abort(403)
-    photo.tags.remove(tag)
-    db.session.commit()
-    tag_photos = db.session.scalars(tag.photos.select()).all()
-    if not tag_photos:
-        db.session.delete(tag)
-        db.session.commit()
+    remove_tag(photo, tag)
     flash("Tag deleted.", "info")
     return redirect(url_for(".show_photo", id=photo_id))
 
 
 @main.get("/tag/<int:id>")
+@anonymous_cached
+@read_from_replica
 def show_tag(id):
     tag = db.get_or_404(Tag, id)
     page = request.args.get("page", 1, type=int)
     order_rule = request.args.get("order_rule", "time")
     per_page = current_app.config["PHOTO_PER_PAGE"]
-    pagination = db.paginate(
-        tag.photos.select().order_by(Photo.created_at.desc()),
-        page=page,
-        per_page=per_page,
-    )
-    photos = pagination.items
+    query = tag.photos.select()
     if order_rule == "collections":
-        photos.sort(key=lambda x: x.collectors_count, reverse=True)
+        query = query.order_by(Photo.collections_count.desc(), Photo.created_at.desc())
+    else:
+        query = query.order_by(Photo.created_at.desc())
+    pagination = db.paginate(query, page=page, per_page=per_page)
+    photos = pagination.items
     return render_template(
         "main/tag.html",
         tag=tag,
@@ -373,7 +401,10 @@ def show_notifications():
     )
     notifications = pagination.items
     return render_template(
-        "main/notifications.html", pagination=pagination, notifications=notifications
+        "main/notifications.html",
+        pagination=pagination,
+        notifications=notifications,
+        actors=load_actors(notifications),
     )
 
 
@@ -392,11 +423,11 @@ def read_notification(id):
 @main.post("/notifications/read/all")
 @login_required
 def read_all_notification():
-    notifications = db.session.scalars(
-        current_user.notifications.select().filter_by(is_read=False)
+    db.session.execute(
+        update(Notification)
+        .filter_by(receiver_id=current_user.id, is_read=False)
+        .values(is_read=True)
     )
-    for notification in notifications:
-        notification.is_read = True
     db.session.commit()
     flash("All notification archived.", "success")
     return redirect(url_for(".show_notifications"))
@@ -407,9 +438,10 @@ def read_all_notification():
 @confirm_required
 def report_comment(id):
     comment = db.get_or_404(Comment, id)
-    comment.flag += 1
-    db.session.commit()
-    flash("Comment reported.", "success")
+    if current_user.report(comment=comment):
+        flash("Comment reported.", "success")
+    else:
+        flash("Already reported.", "info")
     return redirect(url_for(".show_photo", id=comment.photo_id))
 
 
@@ -429,13 +461,13 @@ def new_comment(id):
             comment.replied = db.get_or_404(Comment, replied_id)
             if comment.replied.author.receive_comment_notification:
                 push_comment_notification(
-                    photo_id=photo.id, receiver=comment.replied.author
+                    photo_id=photo.id, receiver=comment.replied.author, actor=author
                 )
         db.session.add(comment)
         db.session.commit()
         flash("Comment publised.", "success")
         if current_user != photo.author and photo.author.receive_comment_notification:
-            push_comment_notification(id, receiver=photo.author, page=page)
+            push_comment_notification(id, receiver=photo.author, actor=author)
     flash_errors(form)
     return redirect(url_for(".show_photo", id=id, page=page))
 
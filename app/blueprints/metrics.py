@@ -0,0 +1,21 @@
+import hmac
+
+from flask import Blueprint, Response, abort, current_app, request
+from flask_login import current_user
+from prometheus_client import CONTENT_TYPE_LATEST
+
+from app.telemetry import generate_metrics
+
+metrics = Blueprint("metrics", __name__)
+
+
+@metrics.get("/metrics")
+def export():
+    token = current_app.config["METRICS_TOKEN"]
+    authorization = request.headers.get("Authorization", "")
+    if (
+        not (token and hmac.compare_digest(authorization, f"Bearer {token}"))
+        and not current_user.is_admin
+    ):
+        abort(403)
+    return Response(generate_metrics(), content_type=CONTENT_TYPE_LATEST)
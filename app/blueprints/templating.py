@@ -3,7 +3,7 @@ from flask_login import current_user
 from sqlalchemy import func, select
 
 from app.extensions import db
-from app.models import Notification, Permission
+from app.models import Notification, NotificationType, Permission
 
 templating = Blueprint("templating", __name__)
 
@@ -17,4 +17,8 @@ def make_template_context():
                 receiver_id=current_user.id, is_read=False
             )
         )
-    return dict(notification_count=notification_count, Permission=Permission)
+    return dict(
+        notification_count=notification_count,
+        Permission=Permission,
+        NotificationType=NotificationType,
+    )
@@ -11,6 +11,7 @@ from flask import (
 from flask_login import current_user, fresh_login_required, login_required, logout_user
 from sqlalchemy import select
 
+from app.caching import anonymous_cached
 from app.config import Operations
 from app.decorators import confirm_required, permission_required
 from app.emails import send_change_email_email
@@ -27,12 +28,15 @@ from app.forms.user import (
 )
 from app.models import Collection, Follow, Permission, Photo, User
 from app.notifications import push_follow_notification
+from app.replicas import read_from_replica
 from app.utils import flash_errors, redirect_back
 
 user = Blueprint("user", __name__)
 
 
 @user.get("/<username>")
+@anonymous_cached
+@read_from_replica
 def index(username):
     user = db.session.scalar(select(User).filter_by(username=username)) or abort(404)
     if user == current_user and user.locked:
@@ -53,6 +57,7 @@ def index(username):
 
 
 @user.get("/<username>/collections")
+@anonymous_cached
 def show_collections(username):
     user = db.session.scalar(select(User).filter_by(username=username)) or abort(404)
     page = request.args.get("page", 1, type=int)
@@ -77,6 +82,9 @@ def show_collections(username):
 @permission_required(Permission.FOLLOW)
 def follow(username):
     user = db.session.scalar(select(User).filter_by(username=username)) or abort(404)
+    if user == current_user:
+        flash("You can't follow yourself.", "info")
+        return redirect(url_for(".index", username=username))
     if current_user.is_following(user):
         flash("Already followed.", "info")
         return redirect(url_for(".index", username=username))
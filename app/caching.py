@@ -0,0 +1,117 @@
+from functools import wraps
+from time import time
+from uuid import uuid4
+
+from flask import current_app, g, make_response, message_flashed, request, session
+from flask_login import current_user
+from flask_wtf.csrf import generate_csrf
+
+from app.extensions import cache
+
+PAGE_CACHE_GENERATION_KEY = "page:generation"
+CSRF_PLACEHOLDER = "__page_cache_csrf_token__"
+LOCAL_CACHE_TYPES = {"null", "NullCache", "simple", "SimpleCache"}
+
+
+def init_page_cache(app):
+    cache_type = app.config["CACHE_TYPE"].rpartition(".")[2]
+    if (
+        app.config["PAGE_CACHE_TIMEOUT"]
+        and app.config["PAGE_CACHE_REQUIRE_SHARED"]
+        and cache_type in LOCAL_CACHE_TYPES
+    ):
+        app.logger.warning(
+            "Page caching is disabled because CACHE_TYPE %s is local to each "
+            "process. Set CACHE_TYPE to a shared backend such as RedisCache.",
+            app.config["CACHE_TYPE"],
+        )
+        app.config["PAGE_CACHE_TIMEOUT"] = 0
+
+
+def page_cache_generation():
+    return cache.get(PAGE_CACHE_GENERATION_KEY)
+
+
+def invalidate_page_cache():
+    cache.set(PAGE_CACHE_GENERATION_KEY, uuid4().hex, timeout=0)
+
+
+def get_or_set(key, func, timeout=None):
+    value = cache.get(key)
+    if value is None:
+        value = func()
+        cache.set(key, value, timeout=timeout)
+    return value
+
+
+def user_cache_key(id):
+    return f"user:{id}:session"
+
+
+def invalidate_user_cache(*ids):
+    cache.delete_many(*map(user_cache_key, ids))
+
+
+def _mark_flashed(sender, **extra):
+    g.page_cache_flashed = True
+
+
+message_flashed.connect(_mark_flashed)
+
+
+def _cached_response(entry):
+    body = entry["body"]
+    if CSRF_PLACEHOLDER in body:
+        body = body.replace(CSRF_PLACEHOLDER, generate_csrf())
+    response = make_response(body, entry["status"])
+    response.mimetype = entry["mimetype"]
+    return response
+
+
+def anonymous_cached(func):
+    @wraps(func)
+    def inner(*args, **kwargs):
+        if (
+            request.method != "GET"
+            or not current_app.config["PAGE_CACHE_TIMEOUT"]
+            or current_user.is_authenticated
+            or "_flashes" in session
+        ):
+            return func(*args, **kwargs)
+        timeout = current_app.config["PAGE_CACHE_TIMEOUT"]
+        stale_timeout = current_app.config["PAGE_CACHE_STALE_TIMEOUT"]
+        key = f"page:{request.full_path}"
+        generation = page_cache_generation()
+        entry = cache.get(key)
+        if (
+            entry is not None
+            and entry["generation"] == generation
+            and (
+                time() - entry["created_at"] < timeout
+                or not cache.add(f"{key}:lock", True, timeout=stale_timeout)
+            )
+        ):
+            return _cached_response(entry)
+
+        response = make_response(func(*args, **kwargs))
+        if (
+            response.status_code == 200
+            and response.mimetype == "text/html"
+            and not g.get("page_cache_flashed")
+        ):
+            body = response.get_data(as_text=True)
+            token = g.get(current_app.config.get("WTF_CSRF_FIELD_NAME", "csrf_token"))
+            if token:
+                body = body.replace(token, CSRF_PLACEHOLDER)
+            entry = {
+                "body": body,
+                "status": response.status_code,
+                "mimetype": response.mimetype,
+                "generation": generation,
+                "created_at": time(),
+            }
+            cache.set(key, entry, timeout=timeout + stale_timeout)
+        cache.delete(f"{key}:lock")
+        return response
+
+    return inner
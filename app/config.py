@@ -39,11 +39,70 @@ class Config:
     MANAGE_PHOTO_PER_PAGE = os.getenv("MANAGE_PHOTO_PER_PAGE", 5)
     MANAGE_TAG_PER_PAGE = os.getenv("MANAGE_TAG_PER_PAGE", 5)
     MANGE_COMMENT_PER_PAGE = os.getenv("MANGE_COMMENT_PER_PAGE", 5)
+    MANAGE_PROFILE_PER_PAGE = os.getenv("MANAGE_PROFILE_PER_PAGE", 20)
+
+    STATS_CACHE_TIMEOUT = int(os.getenv("STATS_CACHE_TIMEOUT", 60))
+    STATS_SNAPSHOT_INTERVAL = int(os.getenv("STATS_SNAPSHOT_INTERVAL", 3600))
+    STATS_HISTORY_LENGTH = int(os.getenv("STATS_HISTORY_LENGTH", 7))
+
+    MODERATION_CHUNK_SIZE = int(os.getenv("MODERATION_CHUNK_SIZE", 500))
+    NOTIFICATION_RETENTION_DAYS = int(os.getenv("NOTIFICATION_RETENTION_DAYS", 90))
+    AJAX_STATE_MAX_IDS = int(os.getenv("AJAX_STATE_MAX_IDS", 100))
+
+    REPLICA_DATABASE_URLS = [
+        url for url in os.getenv("REPLICA_DATABASE_URLS", "").split(",") if url
+    ]
+    SQLALCHEMY_BINDS = {
+        f"replica{i}": url for i, url in enumerate(REPLICA_DATABASE_URLS, 1)
+    }
+    REPLICA_BINDS = list(SQLALCHEMY_BINDS)
+    REPLICA_MAX_LAG = int(os.getenv("REPLICA_MAX_LAG", 10))
+    REPLICA_CHECK_INTERVAL = int(os.getenv("REPLICA_CHECK_INTERVAL", 5))
+    REPLICA_STICKY_TIME = int(os.getenv("REPLICA_STICKY_TIME", 10))
+
+    SQL_SAMPLE_RATE = float(os.getenv("SQL_SAMPLE_RATE", 0))
+    SQL_N_PLUS_ONE_THRESHOLD = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", 5))
+    SQL_PROFILE_WINDOW = int(os.getenv("SQL_PROFILE_WINDOW", 600))
+    SQL_PROFILE_SIZE = int(os.getenv("SQL_PROFILE_SIZE", 1000))
+
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+    PROFILER_INTERVAL = float(os.getenv("PROFILER_INTERVAL", 0.005))
+    PROFILER_REFRESH_INTERVAL = int(os.getenv("PROFILER_REFRESH_INTERVAL", 5))
+
+    WARMUP_URLS = os.getenv("WARMUP_URLS", "/").split()
+    TEMPLATE_CACHE_DIR = os.getenv("TEMPLATE_CACHE_DIR", BASE_DIR / "template-cache")
+
+    ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL")
+
+    SQLITE_PRAGMAS = {}
+    SQLITE_SINGLE_WRITER = False
+    SQLITE_CHECKPOINT_INTERVAL = 0
 
     UPLOAD_PATH = os.getenv("UPLOAD_PATH", BASE_DIR / "uploads")
 
     AVATARS_SAVE_PATH = UPLOAD_PATH / "avatars"
     AVATARS_SIZE_TUPLE = (30, 100, 200)
+    AVATARS_SERVE_LOCAL = False
+    AVATARS_GRAVATAR_DEFAULT = "identicon"
+    AVATARS_IDENTICON_COLS = 7
+    AVATARS_IDENTICON_ROWS = 7
+    AVATARS_IDENTICON_BG = None
+    AVATARS_CROP_BASE_WIDTH = 500
+    AVATARS_CROP_INIT_POS = (0, 0)
+    AVATARS_CROP_INIT_SIZE = None
+    AVATARS_CROP_PREVIEW_SIZE = None
+    AVATARS_CROP_MIN_SIZE = None
+
+    CACHE_TYPE = os.getenv("CACHE_TYPE", "SimpleCache")
+    CACHE_DEFAULT_TIMEOUT = 300
+    PHOTO_CACHE_TIMEOUT = int(os.getenv("PHOTO_CACHE_TIMEOUT", 600))
+    PROFILE_CACHE_TIMEOUT = int(os.getenv("PROFILE_CACHE_TIMEOUT", 600))
+    PAGE_CACHE_TIMEOUT = int(os.getenv("PAGE_CACHE_TIMEOUT", 60))
+    PAGE_CACHE_STALE_TIMEOUT = int(os.getenv("PAGE_CACHE_STALE_TIMEOUT", 300))
+    PAGE_CACHE_REQUIRE_SHARED = False
+    ROLE_REGISTRY_TIMEOUT = int(os.getenv("ROLE_REGISTRY_TIMEOUT", 300))
+    USER_CACHE_TIMEOUT = int(os.getenv("USER_CACHE_TIMEOUT", 30))
 
 
 class DevelopmentConfig(Config):
@@ -51,9 +110,12 @@ class DevelopmentConfig(Config):
         "DATABASE_URL", f"sqlite:///{BASE_DIR / 'db-dev.sqlite'}"
     )
 
+    SQL_SAMPLE_RATE = float(os.getenv("SQL_SAMPLE_RATE", 1))
+
 
 class TestingConfig(Config):
     TESTING = True
+    TEMPLATE_CACHE_DIR = None
     WTF_CSRF_ENABLED = False
     SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"
 
@@ -63,9 +125,33 @@ class ProductionConfig(Config):
         "DATABASE_URL", f"sqlite:///{BASE_DIR / 'db.sqlite'}"
     )
 
+    SQLITE_PRAGMAS = {
+        "journal_mode": "WAL",
+        "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT", 5000)),
+        "synchronous": "NORMAL",
+        "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)),
+        "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", -64 * 1024)),
+        "temp_store": "MEMORY",
+    }
+    SQLITE_SINGLE_WRITER = os.getenv("SQLITE_SINGLE_WRITER", "0") == "1"
+    SQLITE_CHECKPOINT_INTERVAL = int(os.getenv("SQLITE_CHECKPOINT_INTERVAL", 300))
+
+    PAGE_CACHE_REQUIRE_SHARED = True
+
+
+class BenchmarkConfig(Config):
+    WTF_CSRF_ENABLED = False
+    SQLALCHEMY_DATABASE_URI = os.getenv(
+        "BENCHMARK_DATABASE_URL", f"sqlite:///{BASE_DIR / 'db-benchmark.sqlite'}"
+    )
+    UPLOAD_PATH = BASE_DIR / "uploads-benchmark"
+    AVATARS_SAVE_PATH = UPLOAD_PATH / "avatars"
+    WHOOSHEE_DIR = str(BASE_DIR / "whooshee-benchmark")
+
 
 config = {
     "development": DevelopmentConfig,
     "testing": TestingConfig,
     "production": ProductionConfig,
+    "benchmark": BenchmarkConfig,
 }
@@ -3,10 +3,20 @@ from threading import Thread
 from flask import current_app, render_template
 from flask_mailman import EmailMessage
 
+from app.telemetry import EMAIL_QUEUE, EMAILS
+
 
 def _send_async_email(app, message):
     with app.app_context():
-        message.send()
+        try:
+            message.send()
+        except Exception:
+            EMAILS.labels("failed").inc()
+            raise
+        else:
+            EMAILS.labels("sent").inc()
+        finally:
+            EMAIL_QUEUE.dec()
 
 
 def send_email(subject, body, to):
@@ -14,6 +24,7 @@ def send_email(subject, body, to):
     messsage = EmailMessage(subject, body=body, to=[to])
     messsage.content_subtype = "html"
     thr = Thread(target=_send_async_email, args=[app, messsage])
+    EMAIL_QUEUE.inc()
     thr.start()
     return thr
 
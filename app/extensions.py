@@ -1,27 +1,117 @@
-from flask_avatars import Avatars
+from functools import cached_property
+from importlib.util import find_spec
+from pathlib import Path
+
+from flask import Blueprint, current_app
 from flask_bootstrap import Bootstrap5
+from flask_caching import Cache
 from flask_dropzone import Dropzone
 from flask_login import AnonymousUserMixin, LoginManager
 from flask_mailman import Mail
 from flask_sqlalchemy import SQLAlchemy
 from flask_whooshee import Whooshee
 from flask_wtf import CSRFProtect
+from sqlalchemy import select
+from sqlalchemy.orm import make_transient_to_detached
+from werkzeug.local import LocalProxy
+from whoosh.index import LockError
+
+from app.replicas import RoutingSession
+from app.telemetry import WHOOSH_LOCK_ERRORS, WHOOSH_WRITES
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 bootstrap = Bootstrap5()
 login = LoginManager()
 mail = Mail()
-avatars = Avatars()
 dropzone = Dropzone()
 csrf = CSRFProtect()
-whooshee = Whooshee()
+
+
+class LazyAvatars:
+    def init_app(self, app):
+        self.root_path = Path(find_spec("flask_avatars").origin).parent
+        blueprint = Blueprint(
+            "avatars",
+            "flask_avatars",
+            root_path=self.root_path,
+            static_folder="static",
+            static_url_path="/avatars" + app.static_url_path,
+        )
+        app.register_blueprint(blueprint)
+        app.extensions["avatars"] = LocalProxy(self._helpers)
+        app.context_processor(lambda: {"avatars": app.extensions["avatars"]})
+
+    def _helpers(self):
+        from flask_avatars import _Avatars
+
+        return _Avatars
+
+    @cached_property
+    def _avatars(self):
+        from flask_avatars import Avatars
+
+        avatars = Avatars()
+        avatars.root_path = str(self.root_path)
+        return avatars
+
+    def save_avatar(self, image):
+        return self._avatars.save_avatar(image)
+
+    def crop_avatar(self, filename, x, y, w, h):
+        return self._avatars.crop_avatar(filename, x, y, w, h)
+
+
+avatars = LazyAvatars()
+
+
+class TimedWhooshee(Whooshee):
+    def on_commit(self, changes):
+        with WHOOSH_WRITES.time():
+            try:
+                super().on_commit(changes)
+            except LockError:
+                WHOOSH_LOCK_ERRORS.inc()
+                raise
+
+    def delete_documents(self, model, ids):
+        config = current_app.extensions["whooshee"]
+        if not config["enable_indexing"]:
+            return
+        index = self.get_or_create_index(current_app, model._whoosheer_)
+        with WHOOSH_WRITES.time():
+            try:
+                with index.writer(timeout=config["writer_timeout"]) as writer:
+                    for id in ids:
+                        writer.delete_by_term("id", id)
+            except LockError:
+                WHOOSH_LOCK_ERRORS.inc()
+                raise
+
+
+whooshee = TimedWhooshee()
+cache = Cache()
 
 
 @login.user_loader
 def load_user(id):
-    from app.models import User
+    from app.caching import user_cache_key
+    from app.models import SESSION_USER_COLUMNS, User
 
-    return db.session.get(User, id)
+    key = user_cache_key(int(id))
+    columns = cache.get(key)
+    if columns is None:
+        row = db.session.execute(
+            select(*SESSION_USER_COLUMNS).filter_by(id=id)
+        ).one_or_none()
+        if row is None:
+            return None
+        columns = row._asdict()
+        cache.set(key, columns, timeout=current_app.config["USER_CACHE_TIMEOUT"])
+    user = User.__mapper__.class_manager.new_instance()
+    for name, value in columns.items():
+        setattr(user, name, value)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
 
 
 class AnonymousUser(AnonymousUserMixin):
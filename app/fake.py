@@ -1,13 +1,30 @@
 import random
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
 
 from faker import Faker
 from flask import current_app
+from flask_avatars import Identicon
 from PIL import Image
-from sqlalchemy import func, select
+from sqlalchemy import bindparam, func, select, update
 from sqlalchemy.exc import IntegrityError
+from werkzeug.security import generate_password_hash
 
 from app.extensions import db
-from app.models import Comment, Notification, Photo, Tag, User
+from app.models import (
+    Collection,
+    Comment,
+    Follow,
+    Notification,
+    Photo,
+    Tag,
+    User,
+    photo_tag,
+    roles,
+)
+from app.utils import batched
 
 faker = Faker()
 
@@ -52,7 +69,8 @@ def fake_follow(count=30):
     for _ in range(count):
         user = db.session.scalar(select(User).order_by(func.random()).limit(1))
         user2 = db.session.scalar(select(User).order_by(func.random()).limit(1))
-        user.follow(user2)
+        if user != user2:
+            user.follow(user2)
     db.session.commit()
 
 
@@ -119,3 +137,231 @@ def fake_comment(count=100):
         )
         db.session.add(comment)
     db.session.commit()
+
+
+def _pool(factory, size=1000):
+    return [factory() for _ in range(size)]
+
+
+def _id_range(model):
+    first, last = db.session.execute(
+        select(func.min(model.id), func.max(model.id))
+    ).one()
+    return range(first, last + 1) if first is not None else range(0)
+
+
+def _random_datetime(now, days=365):
+    return now - timedelta(seconds=random.randrange(days * 86400))
+
+
+def _bulk_insert(table, rows, total, chunk_size, progress=None):
+    done = 0
+    for chunk in batched(rows, chunk_size):
+        db.session.execute(table.insert(), chunk)
+        db.session.commit()
+        done += len(chunk)
+        if progress is not None:
+            progress(done, total)
+    return done
+
+
+def bulk_fake_user(count, chunk_size=10000, progress=None):
+    first_id = (db.session.scalar(select(func.max(User.id))) or 0) + 1
+    ids = range(first_id, first_id + count)
+    password_hash = generate_password_hash("123456")
+    avatars = [Identicon().generate(text=f"sunny-{i}") for i in range(32)]
+    role_id = roles.get_id("User")
+    names, bios, cities, websites = (
+        _pool(factory)
+        for factory in (faker.name, faker.sentence, faker.city, faker.url)
+    )
+    now = datetime.now(timezone.utc)
+
+    def rows():
+        for id in ids:
+            avatar_s, avatar_m, avatar_l = random.choice(avatars)
+            yield dict(
+                id=id,
+                username=f"user{id}",
+                email=f"user{id}@example.com",
+                password_hash=password_hash,
+                name=random.choice(names)[:30],
+                bio=random.choice(bios)[:120],
+                location=random.choice(cities)[:50],
+                website=random.choice(websites),
+                member_since=_random_datetime(now, days=3650),
+                confirmed=True,
+                role_id=role_id,
+                avatar_s=avatar_s,
+                avatar_m=avatar_m,
+                avatar_l=avatar_l,
+            )
+
+    _bulk_insert(User.__table__, rows(), count, chunk_size, progress)
+    return count
+
+
+def bulk_fake_follow(per_user=20, alpha=1.2, chunk_size=10000, progress=None):
+    ids = list(_id_range(User))
+    if len(ids) < 2:
+        return 0
+    # followers are drawn from a Zipf distribution over a shuffled popularity rank
+    popular = random.sample(ids, len(ids))
+    cum_weights = list(accumulate(1 / rank**alpha for rank in range(1, len(ids) + 1)))
+    degrees = [min(random.randint(0, 2 * per_user), len(ids) - 1) for _ in ids]
+    total = sum(degrees)
+    now = datetime.now(timezone.utc)
+
+    def rows():
+        for follower_id, degree in zip(ids, degrees):
+            followed = set()
+            while len(followed) < degree:
+                followed.update(
+                    random.choices(
+                        popular, cum_weights=cum_weights, k=degree - len(followed)
+                    )
+                )
+                followed.discard(follower_id)
+            for followed_id in followed:
+                yield dict(
+                    follower_id=follower_id,
+                    followed_id=followed_id,
+                    created_at=_random_datetime(now),
+                )
+
+    return _bulk_insert(Follow.__table__, rows(), total, chunk_size, progress)
+
+
+def bulk_fake_tag(count, chunk_size=10000, progress=None):
+    words = _pool(faker.word)
+    existing = set(db.session.scalars(select(Tag.name)))
+
+    def rows():
+        for i in range(count):
+            name = random.choice(words)
+            if name in existing:
+                name = f"{name}{i}"
+            existing.add(name)
+            yield dict(name=name)
+
+    return _bulk_insert(Tag.__table__, rows(), count, chunk_size, progress)
+
+
+def _render_placeholder(upload_path, filename, filename_s, color, sizes):
+    image = Image.new(mode="RGB", size=(sizes["medium"],) * 2, color=color)
+    image.save(upload_path / filename)
+    image.resize((sizes["small"],) * 2).save(upload_path / filename_s)
+
+
+def fake_placeholders(count, workers=None):
+    upload_path = current_app.config["UPLOAD_PATH"]
+    sizes = current_app.config["PHOTO_SIZES"]
+    placeholders = {}
+    for _ in range(count):
+        color = tuple(random.randint(128, 255) for _ in range(3))
+        name = "placeholder_{:02x}{:02x}{:02x}".format(*color)
+        placeholders[name] = (f"{name}.jpg", f"{name}_s.jpg", color)
+    jobs = [
+        (upload_path, filename, filename_s, color, sizes)
+        for filename, filename_s, color in placeholders.values()
+        if not (upload_path / filename).exists()
+    ]
+    if jobs:
+        with ProcessPoolExecutor(workers) as executor:
+            list(executor.map(_render_placeholder, *zip(*jobs)))
+    return [(filename, filename_s) for filename, filename_s, _ in placeholders.values()]
+
+
+def bulk_fake_photo(count, images=64, workers=None, chunk_size=10000, progress=None):
+    placeholders = fake_placeholders(images, workers)
+    user_ids, tag_ids = _id_range(User), _id_range(Tag)
+    first_id = (db.session.scalar(select(func.max(Photo.id))) or 0) + 1
+    ids = range(first_id, first_id + count)
+    descriptions = _pool(faker.text)
+    now = datetime.now(timezone.utc)
+
+    def rows():
+        for id in ids:
+            filename, filename_s = random.choice(placeholders)
+            yield dict(
+                id=id,
+                description=random.choice(descriptions),
+                filename=filename,
+                filename_s=filename_s,
+                filename_m=filename,
+                author_id=random.choice(user_ids),
+                created_at=_random_datetime(now),
+            )
+
+    def tag_rows():
+        for id in ids:
+            for tag_id in random.sample(
+                tag_ids, min(random.randint(1, 5), len(tag_ids))
+            ):
+                yield dict(photo_id=id, tag_id=tag_id)
+
+    _bulk_insert(Photo.__table__, rows(), count, chunk_size, progress)
+    if tag_ids:
+        _bulk_insert(photo_tag, tag_rows(), count * 3, chunk_size)
+    return count
+
+
+def bulk_fake_collect(count, chunk_size=10000, progress=None):
+    user_ids, photo_ids = _id_range(User), _id_range(Photo)
+    if not user_ids or not photo_ids:
+        return 0
+    # each user collects distinct photos, so no pair is ever generated twice
+    per_user = count / len(user_ids)
+    degrees = [
+        min(random.randint(0, round(2 * per_user)), len(photo_ids)) for _ in user_ids
+    ]
+    counts = array("I", bytes(4 * len(photo_ids)))
+    now = datetime.now(timezone.utc)
+
+    def rows():
+        for user_id, degree in zip(user_ids, degrees):
+            for photo_id in random.sample(photo_ids, degree):
+                counts[photo_id - photo_ids.start] += 1
+                yield dict(
+                    user_id=user_id, photo_id=photo_id, created_at=_random_datetime(now)
+                )
+
+    done = _bulk_insert(
+        Collection.__table__, rows(), sum(degrees), chunk_size, progress
+    )
+    table = Photo.__table__
+    statement = (
+        update(table)
+        .where(table.c.id == bindparam("photo_id"))
+        .values(collections_count=bindparam("count"))
+    )
+    for chunk in batched(
+        (
+            dict(photo_id=photo_ids.start + i, count=n)
+            for i, n in enumerate(counts)
+            if n
+        ),
+        chunk_size,
+    ):
+        db.session.execute(statement, chunk)
+        db.session.commit()
+    return done
+
+
+def bulk_fake_comment(count, chunk_size=10000, progress=None):
+    user_ids, photo_ids = _id_range(User), _id_range(Photo)
+    if not user_ids or not photo_ids:
+        return 0
+    bodies = _pool(faker.sentence)
+    now = datetime.now(timezone.utc)
+
+    def rows():
+        for _ in range(count):
+            yield dict(
+                body=random.choice(bodies),
+                author_id=random.choice(user_ids),
+                photo_id=random.choice(photo_ids),
+                created_at=_random_datetime(now),
+            )
+
+    return _bulk_insert(Comment.__table__, rows(), count, chunk_size, progress)
@@ -4,7 +4,7 @@ from wtforms.validators import DataRequired, Email, Length, ValidationError
 
 from app.extensions import db
 from app.forms.user import EditProfileForm
-from app.models import Role, User
+from app.models import User, roles
 
 
 class EditProfileAdminForm(EditProfileForm):
@@ -16,8 +16,7 @@ class EditProfileAdminForm(EditProfileForm):
 
     def __init__(self, user, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        roles = db.session.scalars(select(Role).order_by(Role.name)).all()
-        self.role.choices = [(r.id, r.name) for r in roles]
+        self.role.choices = [(r.id, r.name) for r in roles.all()]
         self.user = user
 
     def validate_username(self, field):
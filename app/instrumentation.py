@@ -0,0 +1,162 @@
+import re
+from collections import deque
+from random import random
+from time import perf_counter, time
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|\$\d+|:\w+")
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE = re.compile(r"\s+")
+
+
+def fingerprint(statement):
+    statement = _PLACEHOLDER.sub("?", statement)
+    statement = _LITERAL.sub("?", statement)
+    statement = _LIST.sub("(?)", statement)
+    return _SPACE.sub(" ", statement).strip()
+
+
+def start_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and "sql_profile" in g:
+        context.query_start = perf_counter()
+
+
+def finish_query(conn, cursor, statement, parameters, context, executemany):
+    if not has_request_context() or "sql_profile" not in g:
+        return
+    start = getattr(context, "query_start", None)
+    if start is None:
+        return
+    elapsed = perf_counter() - start
+    profile = g.sql_profile
+    profile["count"] += 1
+    profile["time"] += elapsed
+    query = profile["queries"].setdefault(fingerprint(statement), [0, 0.0, 0.0])
+    query[0] += 1
+    query[1] += elapsed
+    query[2] = max(query[2], elapsed)
+
+
+def start_profile():
+    if random() < current_app.config["SQL_SAMPLE_RATE"]:
+        g.sql_profile = dict(start=perf_counter(), count=0, time=0.0, queries={})
+
+
+def finish_profile(response):
+    profile = g.pop("sql_profile", None)
+    if profile is None:
+        return response
+    duration = perf_counter() - profile["start"]
+    response.headers.add(
+        "Server-Timing",
+        f'db;dur={profile["time"] * 1000:.1f};desc="{profile["count"]} queries"',
+    )
+    response.headers.add("Server-Timing", f"total;dur={duration * 1000:.1f}")
+
+    threshold = current_app.config["SQL_N_PLUS_ONE_THRESHOLD"]
+    repeated = {
+        statement: count
+        for statement, (count, _, _) in profile["queries"].items()
+        if count >= threshold
+    }
+    for statement, count in repeated.items():
+        current_app.logger.warning(
+            "Possible N+1 in %s: %d x %s", request.endpoint, count, statement[:200]
+        )
+    current_app.extensions["sql_profiles"].append(
+        dict(
+            at=time(),
+            endpoint=request.endpoint or request.path,
+            duration=duration,
+            time=profile["time"],
+            count=profile["count"],
+            queries=profile["queries"],
+            repeated=repeated,
+        )
+    )
+    return response
+
+
+def _percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, len(values) * percent // 100)]
+
+
+def summarize(window=None, limit=20):
+    window = window or current_app.config["SQL_PROFILE_WINDOW"]
+    cutoff = time() - window
+    records = [
+        r for r in list(current_app.extensions["sql_profiles"]) if r["at"] >= cutoff
+    ]
+
+    endpoints = {}
+    queries = {}
+    n_plus_one = {}
+    for record in records:
+        endpoint = endpoints.setdefault(
+            record["endpoint"], dict(durations=[], count=0, time=0.0)
+        )
+        endpoint["durations"].append(record["duration"])
+        endpoint["count"] += record["count"]
+        endpoint["time"] += record["time"]
+        for statement, (count, total, slowest) in record["queries"].items():
+            query = queries.setdefault(
+                statement, dict(count=0, time=0.0, max=0.0, endpoints=set())
+            )
+            query["count"] += count
+            query["time"] += total
+            query["max"] = max(query["max"], slowest)
+            query["endpoints"].add(record["endpoint"])
+        for statement, count in record["repeated"].items():
+            key = (record["endpoint"], statement)
+            n_plus_one[key] = max(n_plus_one.get(key, 0), count)
+
+    endpoint_rows = [
+        dict(
+            endpoint=name,
+            requests=len(e["durations"]),
+            p50=_percentile(e["durations"], 50) * 1000,
+            p95=_percentile(e["durations"], 95) * 1000,
+            queries=e["count"] / len(e["durations"]),
+            db_time=e["time"] / len(e["durations"]) * 1000,
+        )
+        for name, e in endpoints.items()
+    ]
+    query_rows = [
+        dict(
+            statement=statement,
+            count=q["count"],
+            time=q["time"] * 1000,
+            avg=q["time"] / q["count"] * 1000,
+            max=q["max"] * 1000,
+            endpoints=sorted(q["endpoints"]),
+        )
+        for statement, q in queries.items()
+    ]
+    return dict(
+        window=window,
+        requests=len(records),
+        endpoints=sorted(endpoint_rows, key=lambda e: e["p95"], reverse=True)[:limit],
+        queries=sorted(query_rows, key=lambda q: q["time"], reverse=True)[:limit],
+        n_plus_one=[
+            dict(endpoint=endpoint, statement=statement, count=count)
+            for (endpoint, statement), count in sorted(
+                n_plus_one.items(), key=lambda item: item[1], reverse=True
+            )
+        ][:limit],
+    )
+
+
+def init_instrumentation(app):
+    app.extensions["sql_profiles"] = deque(maxlen=app.config["SQL_PROFILE_SIZE"])
+    app.before_request(start_profile)
+    app.after_request(finish_profile)
+    if app.config["SQL_SAMPLE_RATE"] and not event.contains(
+        Engine, "before_cursor_execute", start_query
+    ):
+        event.listen(Engine, "before_cursor_execute", start_query)
+        event.listen(Engine, "after_cursor_execute", finish_query)
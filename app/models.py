@@ -1,14 +1,34 @@
 from datetime import datetime, timedelta, timezone
+from time import monotonic
 
-import jwt
 from flask import current_app
-from flask_avatars import Identicon
 from flask_login import UserMixin
-from jwt.exceptions import InvalidTokenError
-from sqlalchemy import Column, ForeignKey, String, Text, engine, event, func, select
-from sqlalchemy.orm import Mapped, WriteOnlyMapped, mapped_column, relationship
+from sqlalchemy import (
+    Column,
+    ForeignKey,
+    SmallInteger,
+    String,
+    Text,
+    UniqueConstraint,
+    engine,
+    event,
+    func,
+    inspect,
+    select,
+    text,
+    update,
+)
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import (
+    Mapped,
+    Session,
+    WriteOnlyMapped,
+    mapped_column,
+    relationship,
+)
 from werkzeug.security import check_password_hash, generate_password_hash
 
+from app.caching import invalidate_page_cache, invalidate_user_cache
 from app.extensions import db, whooshee
 
 
@@ -17,7 +37,7 @@ class Follow(db.Model):
         ForeignKey("user.id", ondelete="CASCADE"), primary_key=True
     )
     followed_id: Mapped[int] = mapped_column(
-        ForeignKey("user.id", ondelete="CASCADE"), primary_key=True
+        ForeignKey("user.id", ondelete="CASCADE"), primary_key=True, index=True
     )
     created_at: Mapped[datetime] = mapped_column(
         default=lambda: datetime.now(timezone.utc)
@@ -46,7 +66,7 @@ class User(db.Model, UserMixin):
     confirmed: Mapped[bool] = mapped_column(default=False)
     role_id: Mapped[int | None] = mapped_column(ForeignKey("role.id"))
     role: Mapped["Role"] = relationship(back_populates="users")
-    photos: WriteOnlyMapped[["Photo"]] = relationship(
+    photos: WriteOnlyMapped["Photo"] = relationship(
         back_populates="author", cascade="all, delete-orphan", passive_deletes=True
     )
     avatar_s: Mapped[str | None] = mapped_column(String(64))
@@ -69,7 +89,10 @@ class User(db.Model, UserMixin):
         passive_deletes=True,
     )
     notifications: WriteOnlyMapped["Notification"] = relationship(
-        back_populates="receiver", cascade="all, delete-orphan", passive_deletes=True
+        foreign_keys="Notification.receiver_id",
+        back_populates="receiver",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
     )
     receive_comment_notification: Mapped[bool] = mapped_column(default=True)
     receive_follow_notification: Mapped[bool] = mapped_column(default=True)
@@ -80,12 +103,12 @@ class User(db.Model, UserMixin):
     )
     locked: Mapped[bool] = mapped_column(default=False)
     active: Mapped[bool] = mapped_column(default=True)
+    version: Mapped[int] = mapped_column(default=0)
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.set_role()
         self.generate_avatar()
-        self.follow(self)
 
     @property
     def password(self):
@@ -99,6 +122,8 @@ class User(db.Model, UserMixin):
         return check_password_hash(self.password_hash, password)
 
     def generate_token(self, operation, expires_in=3600, **kwargs):
+        import jwt
+
         payload = {
             "id": self.id,
             "operation": operation.value,
@@ -108,31 +133,41 @@ class User(db.Model, UserMixin):
         return jwt.encode(payload, current_app.config["SECRET_KEY"], algorithm="HS256")
 
     def parse_token(self, token, operation):
+        import jwt
+
         try:
             payload = jwt.decode(
                 token, current_app.config["SECRET_KEY"], algorithms=["HS256"]
             )
-        except InvalidTokenError:
+        except jwt.InvalidTokenError:
             return {}
         if operation.value != payload.get("operation") or self.id != payload.get("id"):
             return {}
         return payload
 
     def set_role(self):
-        if self.role is None:
+        if self.role is None and self.role_id is None:
             role_name = (
                 "Admin" if self.email == current_app.config["ADMIN_EMAIL"] else "User"
             )
-            self.role = db.session.scalar(select(Role).filter_by(name=role_name))
+            self.role_id = roles.get_id(role_name)
+
+    @property
+    def role_name(self):
+        role = roles.get(self.role_id)
+        return role and role.name
 
     @property
     def is_admin(self):
         return self.can(Permission.ADMIN)
 
     def can(self, perm):
-        return self.role is not None and self.role.has_permission(perm)
+        role = roles.get(self.role_id)
+        return role is not None and role.permissions & perm == perm
 
     def generate_avatar(self):
+        from flask_avatars import Identicon
+
         avatar = Identicon()
         self.avatar_s, self.avatar_m, self.avatar_l = avatar.generate(
             text=self.username
@@ -179,38 +214,42 @@ class User(db.Model, UserMixin):
 
     def is_followed_by(self, user):
         return (
-            db.session.scalar(self.followers.select().filter_by(followed_id=user.id))
+            db.session.scalar(self.followers.select().filter_by(follower_id=user.id))
             is not None
         )
 
-    @staticmethod
-    def follow_self_all():
-        for user in db.session.scalars(select(User)):
-            user.follow(user)
-        db.session.commit()
-
     @property
     def followers_count(self):
-        return (
-            db.session.scalar(self.followers.select().with_only_columns(func.count()))
-            - 1
+        return db.session.scalar(
+            self.followers.select().with_only_columns(func.count())
         )
 
     @property
     def following_count(self):
-        return (
-            db.session.scalar(self.following.select().with_only_columns(func.count()))
-            - 1
+        return db.session.scalar(
+            self.following.select().with_only_columns(func.count())
         )
 
+    def report(self, photo=None, comment=None):
+        target = photo or comment
+        report = Report(reporter=self, photo=photo, comment=comment)
+        db.session.add(report)
+        target.flag = type(target).flag + 1
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return False
+        return True
+
     def lock(self):
         self.locked = True
-        self.role = db.session.scalar(select(Role).filter_by(name="Locked"))
+        self.role_id = roles.get_id("Locked")
         db.session.commit()
 
     def unlock(self):
         self.locked = False
-        self.role = db.session.scalar(select(Role).filter_by(name="User"))
+        self.role_id = roles.get_id("User")
         db.session.commit()
 
     @property
@@ -226,6 +265,13 @@ class User(db.Model, UserMixin):
         db.session.commit()
 
 
+SESSION_USER_COLUMNS = [
+    column
+    for column in User.__table__.c
+    if column.key not in {"password_hash", "version"}
+]
+
+
 class Permission:
     FOLLOW = 1
     COLLECT = 2
@@ -297,6 +343,47 @@ class Role(db.Model):
         db.session.commit()
 
 
+class RoleRegistry:
+    @property
+    def _state(self):
+        return current_app.extensions.setdefault(
+            "role_registry", {"roles": {}, "loaded_at": None}
+        )
+
+    def load(self):
+        rows = db.session.execute(
+            select(Role.id, Role.name, Role.permissions, Role.default)
+        ).all()
+        state = self._state
+        state["roles"] = {row.id: row for row in rows} | {row.name: row for row in rows}
+        state["loaded_at"] = monotonic()
+
+    def invalidate(self):
+        self._state["loaded_at"] = None
+
+    def get(self, key):
+        state = self._state
+        if (
+            state["loaded_at"] is None
+            or monotonic() - state["loaded_at"]
+            > current_app.config["ROLE_REGISTRY_TIMEOUT"]
+        ):
+            self.load()
+        return state["roles"].get(key)
+
+    def get_id(self, name):
+        role = self.get(name)
+        return role and role.id
+
+    def all(self):
+        self.get(None)
+        rows = {row.id: row for row in self._state["roles"].values()}
+        return sorted(rows.values(), key=lambda row: row.name)
+
+
+roles = RoleRegistry()
+
+
 photo_tag = db.Table(
     "photo_tag",
     Column("photo_id", ForeignKey("photo.id", ondelete="CASCADE"), primary_key=True),
@@ -306,6 +393,19 @@ photo_tag = db.Table(
 
 @whooshee.register_model("description")
 class Photo(db.Model):
+    __table_args__ = (
+        db.Index(
+            "ix_photo_collections_count_created_at", "collections_count", "created_at"
+        ),
+        db.Index("ix_photo_author_id_created_at_id", "author_id", "created_at", "id"),
+        db.Index(
+            "ix_photo_flag_reported",
+            "flag",
+            sqlite_where=text("flag > 0"),
+            postgresql_where=text("flag > 0"),
+        ),
+    )
+
     id: Mapped[int] = mapped_column(primary_key=True)
     description: Mapped[str | None] = mapped_column(String(500))
     filename: Mapped[str] = mapped_column(String(64))
@@ -314,6 +414,8 @@ class Photo(db.Model):
     )
     can_comment: Mapped[bool] = mapped_column(default=True)
     flag: Mapped[int] = mapped_column(default=0)
+    version: Mapped[int] = mapped_column(default=0)
+    collections_count: Mapped[int] = mapped_column(default=0)
     author_id: Mapped[int] = mapped_column(ForeignKey("user.id", ondelete="CASCADE"))
     author: Mapped["User"] = relationship(back_populates="photos")
     filename: Mapped[str] = mapped_column(String(64))
@@ -331,9 +433,28 @@ class Photo(db.Model):
 
     @property
     def collectors_count(self):
-        return db.session.scalar(
-            select(func.count(Collection.user_id)).filter_by(user_id=self.id)
+        return self.collections_count
+
+    def get_neighbors(self):
+        order = (Photo.created_at.desc(), Photo.id.desc())
+        photos = (
+            select(
+                Photo.id,
+                func.lag(Photo.id).over(order_by=order).label("previous_id"),
+                func.lead(Photo.id).over(order_by=order).label("next_id"),
+                func.lead(Photo.filename_m).over(order_by=order).label("next_filename"),
+            )
+            .filter_by(author_id=self.author_id)
+            .subquery()
         )
+        return db.session.execute(
+            select(
+                photos.c.previous_id, photos.c.next_id, photos.c.next_filename
+            ).filter(photos.c.id == self.id)
+        ).one()
+
+    def cache_key(self, fragment, *args):
+        return ":".join(map(str, ["photo", self.id, self.version, fragment, *args]))
 
 
 @whooshee.register_model("name")
@@ -359,18 +480,116 @@ class Collection(db.Model):
     photo: Mapped["Photo"] = relationship(back_populates="collections", lazy="joined")
 
 
+class Report(db.Model):
+    __table_args__ = (
+        UniqueConstraint("reporter_id", "photo_id"),
+        UniqueConstraint("reporter_id", "comment_id"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    reporter_id: Mapped[int] = mapped_column(ForeignKey("user.id", ondelete="CASCADE"))
+    photo_id: Mapped[int | None] = mapped_column(
+        ForeignKey("photo.id", ondelete="CASCADE")
+    )
+    comment_id: Mapped[int | None] = mapped_column(
+        ForeignKey("comment.id", ondelete="CASCADE")
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        default=lambda: datetime.now(timezone.utc)
+    )
+    reporter: Mapped["User"] = relationship()
+    photo: Mapped["Photo"] = relationship()
+    comment: Mapped["Comment"] = relationship()
+
+
+class StatsSnapshot(db.Model):
+    id: Mapped[int] = mapped_column(primary_key=True)
+    created_at: Mapped[datetime] = mapped_column(
+        default=lambda: datetime.now(timezone.utc), index=True
+    )
+    user_count: Mapped[int]
+    locked_user_count: Mapped[int]
+    blocked_user_count: Mapped[int]
+    photo_count: Mapped[int]
+    reported_photo_count: Mapped[int]
+    tag_count: Mapped[int]
+    comment_count: Mapped[int]
+    reported_comment_count: Mapped[int]
+
+
+class Heartbeat(db.Model):
+    id: Mapped[int] = mapped_column(primary_key=True)
+    beat_at: Mapped[float]
+
+
+class RequestProfile(db.Model):
+    id: Mapped[int] = mapped_column(primary_key=True)
+    session: Mapped[str] = mapped_column(String(32), index=True)
+    endpoint: Mapped[str] = mapped_column(String(128))
+    path: Mapped[str] = mapped_column(String(255))
+    user_id: Mapped[int | None]
+    duration: Mapped[float]
+    samples: Mapped[int]
+    stacks: Mapped[str] = mapped_column(Text)
+    created_at: Mapped[datetime] = mapped_column(
+        default=lambda: datetime.now(timezone.utc), index=True
+    )
+
+
+class ProfilerTarget(db.Model):
+    id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    endpoint: Mapped[str | None] = mapped_column(String(128))
+    user_id: Mapped[int | None]
+    token: Mapped[str | None] = mapped_column(String(32))
+    limit: Mapped[int]
+    until: Mapped[float] = mapped_column(index=True)
+
+
+class NotificationType:
+    MESSAGE = 0
+    FOLLOW = 1
+    COMMENT = 2
+    COLLECT = 3
+
+
 class Notification(db.Model):
+    __table_args__ = (
+        db.Index(
+            "ix_notification_receiver_id_is_read_created_at",
+            "receiver_id",
+            "is_read",
+            "created_at",
+        ),
+    )
+
     id: Mapped[int] = mapped_column(primary_key=True)
-    message: Mapped[str] = mapped_column(Text)
+    type: Mapped[int] = mapped_column(SmallInteger, default=NotificationType.MESSAGE)
+    actor_id: Mapped[int | None] = mapped_column(
+        ForeignKey("user.id", ondelete="CASCADE")
+    )
+    object_id: Mapped[int | None]
+    count: Mapped[int] = mapped_column(default=1)
+    message: Mapped[str] = mapped_column(Text, default="")
     is_read: Mapped[bool] = mapped_column(default=False)
     created_at: Mapped[datetime] = mapped_column(
         default=lambda: datetime.now(timezone.utc), index=True
     )
     receiver_id: Mapped[int] = mapped_column(ForeignKey("user.id", ondelete="CASCADE"))
-    receiver: Mapped["User"] = relationship(back_populates="notifications")
+    receiver: Mapped["User"] = relationship(
+        foreign_keys=[receiver_id], back_populates="notifications"
+    )
 
 
 class Comment(db.Model):
+    __table_args__ = (
+        db.Index(
+            "ix_comment_flag_reported",
+            "flag",
+            sqlite_where=text("flag > 0"),
+            postgresql_where=text("flag > 0"),
+        ),
+    )
+
     id: Mapped[int] = mapped_column(primary_key=True)
     body: Mapped[str] = mapped_column(Text)
     created_at: Mapped[datetime] = mapped_column(
@@ -381,7 +600,9 @@ class Comment(db.Model):
         ForeignKey("comment.id", ondelete="CASCADE")
     )
     author_id: Mapped[int] = mapped_column(ForeignKey("user.id", ondelete="CASCADE"))
-    photo_id: Mapped[int] = mapped_column(ForeignKey("photo.id", ondelete="CASCADE"))
+    photo_id: Mapped[int] = mapped_column(
+        ForeignKey("photo.id", ondelete="CASCADE"), index=True
+    )
     replies: WriteOnlyMapped["Comment"] = relationship(
         back_populates="replied", cascade="all, delete-orphan", passive_deletes=True
     )
@@ -424,3 +645,188 @@ def delete_avatars(**kwargs):
             path = current_app.config["AVATARS_SAVE_PATH"] / filename
             if path.exists():
                 path.unlink()
+
+
+@event.listens_for(User, "before_update")
+def bump_user_version(mapper, connection, target):
+    state = inspect(target)
+    if any(
+        state.attrs[key].history.has_changes()
+        for key in ("name", "username", "avatar_m")
+    ):
+        target.version = User.version + 1
+
+
+@event.listens_for(Follow, "after_insert")
+@event.listens_for(Follow, "after_delete")
+def bump_followed_user_version(mapper, connection, target):
+    connection.execute(
+        update(User)
+        .where(User.id == target.followed_id)
+        .values(version=User.version + 1)
+    )
+
+
+@event.listens_for(Photo, "after_insert")
+@event.listens_for(Photo, "after_delete")
+def bump_author_version(mapper, connection, target):
+    connection.execute(
+        update(User).where(User.id == target.author_id).values(version=User.version + 1)
+    )
+
+
+@event.listens_for(Photo, "before_update")
+def bump_photo_version(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[key].history.has_changes() for key in ("description", "tags")):
+        target.version = Photo.version + 1
+
+
+@event.listens_for(Comment, "after_insert")
+@event.listens_for(Comment, "after_delete")
+def bump_parent_photo_version(mapper, connection, target):
+    connection.execute(
+        update(Photo)
+        .where(Photo.id == target.photo_id)
+        .values(version=Photo.version + 1)
+    )
+
+
+@event.listens_for(User, "before_delete")
+def decrease_collected_photos_count(mapper, connection, target):
+    connection.execute(
+        update(Photo)
+        .where(
+            Photo.id.in_(
+                select(Collection.photo_id).where(Collection.user_id == target.id)
+            )
+        )
+        .values(
+            collections_count=Photo.collections_count - 1, version=Photo.version + 1
+        )
+    )
+
+
+@event.listens_for(Collection, "after_insert")
+def increase_collections_count(mapper, connection, target):
+    connection.execute(
+        update(Photo)
+        .where(Photo.id == target.photo_id)
+        .values(
+            collections_count=Photo.collections_count + 1, version=Photo.version + 1
+        )
+    )
+
+
+@event.listens_for(Collection, "after_delete")
+def decrease_collections_count(mapper, connection, target):
+    connection.execute(
+        update(Photo)
+        .where(Photo.id == target.photo_id)
+        .values(
+            collections_count=Photo.collections_count - 1, version=Photo.version + 1
+        )
+    )
+
+
+@event.listens_for(Tag, "before_delete")
+def bump_tagged_photos_version(mapper, connection, target):
+    connection.execute(
+        update(Photo)
+        .where(
+            Photo.id.in_(
+                select(photo_tag.c.photo_id).where(photo_tag.c.tag_id == target.id)
+            )
+        )
+        .values(version=Photo.version + 1)
+    )
+
+
+PAGE_CACHE_MODELS = {
+    User: (
+        "username",
+        "name",
+        "website",
+        "bio",
+        "location",
+        "avatar_s",
+        "avatar_m",
+        "avatar_l",
+        "public_collections",
+    ),
+    Photo: (
+        "description",
+        "tags",
+        "can_comment",
+        "collections_count",
+        "filename",
+        "filename_s",
+        "filename_m",
+    ),
+    Tag: ("name",),
+    Comment: ("body",),
+    Follow: (),
+    Collection: (),
+}
+
+
+def changes_cached_pages(obj, state):
+    attrs = PAGE_CACHE_MODELS.get(type(obj))
+    if attrs is None:
+        return False
+    if state != "dirty":
+        return True
+    obj_state = inspect(obj)
+    return any(obj_state.attrs[key].history.has_changes() for key in attrs)
+
+
+@event.listens_for(Session, "after_flush")
+def mark_page_cache_dirty(session, flush_context):
+    changes = [
+        *((obj, "new") for obj in session.new),
+        *((obj, "dirty") for obj in session.dirty),
+        *((obj, "deleted") for obj in session.deleted),
+    ]
+    if any(changes_cached_pages(obj, state) for obj, state in changes):
+        session.info["page_cache_dirty"] = True
+
+
+@event.listens_for(Session, "after_flush")
+def mark_users_dirty(session, flush_context):
+    for obj in (*session.dirty, *session.deleted):
+        if isinstance(obj, User):
+            session.info.setdefault("dirty_users", set()).add(obj.id)
+
+
+@event.listens_for(Session, "after_flush")
+def mark_roles_dirty(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Role):
+            session.info["roles_dirty"] = True
+            break
+
+
+@event.listens_for(Session, "after_commit")
+def expire_page_cache(session):
+    if session.info.pop("page_cache_dirty", False):
+        invalidate_page_cache()
+
+
+@event.listens_for(Session, "after_commit")
+def expire_role_registry(session):
+    if session.info.pop("roles_dirty", False):
+        roles.invalidate()
+
+
+@event.listens_for(Session, "after_commit")
+def expire_user_cache(session):
+    dirty_users = session.info.pop("dirty_users", None)
+    if dirty_users:
+        invalidate_user_cache(*dirty_users)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def discard_cache_marks(session, previous_transaction):
+    session.info.pop("page_cache_dirty", None)
+    session.info.pop("roles_dirty", None)
+    session.info.pop("dirty_users", None)
@@ -0,0 +1,149 @@
+from flask import current_app
+from sqlalchemy import delete, or_, select, update
+
+from app.caching import invalidate_page_cache, invalidate_user_cache
+from app.extensions import db, whooshee
+from app.models import Comment, Follow, Photo, User, roles
+from app.utils import batched
+
+
+def filter_photos(ids=None, author=None, min_flag=None):
+    if not (ids or author or min_flag is not None):
+        return None
+    query = select(Photo.id)
+    if ids:
+        query = query.filter(Photo.id.in_(ids))
+    if author:
+        query = query.join(Photo.author).filter(User.username == author)
+    if min_flag is not None:
+        query = query.filter(Photo.flag > min_flag)
+    return query
+
+
+def filter_comments(ids=None, author=None, min_flag=None):
+    if not (ids or author or min_flag is not None):
+        return None
+    query = select(Comment.id)
+    if ids:
+        query = query.filter(Comment.id.in_(ids))
+    if author:
+        query = query.join(Comment.author).filter(User.username == author)
+    if min_flag is not None:
+        query = query.filter(Comment.flag > min_flag)
+    return query
+
+
+def filter_users(ids=None):
+    if not ids:
+        return None
+    protected = [roles.get_id("Admin"), roles.get_id("Moderator")]
+    return select(User.id).filter(
+        User.id.in_(ids), or_(User.role_id.is_(None), User.role_id.not_in(protected))
+    )
+
+
+def _chunks(query, chunk_size=None):
+    ids = db.session.scalars(query).all()
+    chunk_size = chunk_size or current_app.config["MODERATION_CHUNK_SIZE"]
+    return len(ids), batched(ids, chunk_size)
+
+
+def _remove_files(directory, filenames):
+    for filename in filenames:
+        if filename is not None:
+            path = directory / filename
+            if path.exists():
+                path.unlink()
+
+
+def delete_photos(query, chunk_size=None, progress=None):
+    total, chunks = _chunks(query, chunk_size)
+    done = 0
+    for chunk in chunks:
+        rows = db.session.execute(
+            select(Photo.filename, Photo.filename_s, Photo.filename_m).filter(
+                Photo.id.in_(chunk)
+            )
+        ).all()
+        db.session.execute(
+            update(User)
+            .filter(User.id.in_(select(Photo.author_id).filter(Photo.id.in_(chunk))))
+            .values(version=User.version + 1)
+        )
+        db.session.execute(delete(Photo).filter(Photo.id.in_(chunk)))
+        db.session.commit()
+        whooshee.delete_documents(Photo, chunk)
+        _remove_files(
+            current_app.config["UPLOAD_PATH"], {name for row in rows for name in row}
+        )
+        done += len(chunk)
+        if progress is not None:
+            progress(done, total)
+    invalidate_page_cache()
+    return done
+
+
+def delete_comments(query, chunk_size=None, progress=None):
+    total, chunks = _chunks(query, chunk_size)
+    done = 0
+    for chunk in chunks:
+        db.session.execute(
+            update(Photo)
+            .filter(
+                Photo.id.in_(select(Comment.photo_id).filter(Comment.id.in_(chunk)))
+            )
+            .values(version=Photo.version + 1)
+        )
+        db.session.execute(delete(Comment).filter(Comment.id.in_(chunk)))
+        db.session.commit()
+        done += len(chunk)
+        if progress is not None:
+            progress(done, total)
+    invalidate_page_cache()
+    return done
+
+
+def _update_users(query, values, chunk_size=None, progress=None):
+    total, chunks = _chunks(query, chunk_size)
+    done = 0
+    for chunk in chunks:
+        db.session.execute(update(User).filter(User.id.in_(chunk)).values(**values))
+        db.session.commit()
+        invalidate_user_cache(*chunk)
+        done += len(chunk)
+        if progress is not None:
+            progress(done, total)
+    invalidate_page_cache()
+    return done
+
+
+def lock_users(query, chunk_size=None, progress=None):
+    values = dict(locked=True, role_id=roles.get_id("Locked"))
+    return _update_users(query, values, chunk_size, progress)
+
+
+def block_users(query, chunk_size=None, progress=None):
+    return _update_users(query, dict(active=False), chunk_size, progress)
+
+
+def delete_self_follows(chunk_size=None, progress=None):
+    total, chunks = _chunks(
+        select(Follow.follower_id).filter(Follow.follower_id == Follow.followed_id),
+        chunk_size,
+    )
+    done = 0
+    for chunk in chunks:
+        db.session.execute(
+            delete(Follow).filter(
+                Follow.follower_id.in_(chunk), Follow.follower_id == Follow.followed_id
+            )
+        )
+        db.session.execute(
+            update(User).filter(User.id.in_(chunk)).values(version=User.version + 1)
+        )
+        db.session.commit()
+        done += len(chunk)
+        if progress is not None:
+            progress(done, total)
+    invalidate_page_cache()
+    return done
@@ -1,31 +1,173 @@
-from flask import url_for
+import re
+from datetime import datetime, timedelta, timezone
+from urllib.parse import unquote
+
+from flask import current_app
+from sqlalchemy import case, delete, func, select, text, update
+from sqlalchemy.exc import OperationalError
 
 from app.extensions import db
-from app.models import Notification
+from app.models import Notification, NotificationType, User
+from app.telemetry import NOTIFICATIONS
 
+LEGACY_FOLLOW = re.compile(
+    r'^User <a href="[^"]*/user/([^/"]+)">[^<]*</a> followed you\.$'
+)
+LEGACY_COLLECT = re.compile(
+    r'^User <a href="[^"]*/user/([^/"]+)">[^<]*</a> collected your '
+    r'<a href="[^"]*/photo/(\d+)">photo</a>\.$'
+)
+LEGACY_COMMENT = re.compile(
+    r'^User <a href="[^"]*/photo/(\d+)[^"]*">This photo</a> has new comment/reply\.$'
+)
 
-def push_follow_notification(follower, receiver):
-    user_url = url_for("user.index", username=follower.username)
-    message = f'User <a href="{user_url}">{follower.username}</a> followed you.'
-    notification = Notification(message=message, receiver=receiver)
-    db.session.add(notification)
+
+def push_notification(type, receiver, actor=None, object_id=None):
+    actor_id = actor and actor.id
+    count = Notification.count + 1
+    if actor_id is not None:
+        count = case(
+            (Notification.actor_id == actor_id, Notification.count), else_=count
+        )
+    aggregated = db.session.execute(
+        update(Notification)
+        .filter_by(
+            receiver_id=receiver.id, type=type, object_id=object_id, is_read=False
+        )
+        .values(
+            count=count,
+            actor_id=actor_id,
+            created_at=datetime.now(timezone.utc),
+        )
+    ).rowcount
+    if not aggregated:
+        db.session.add(
+            Notification(
+                type=type,
+                actor_id=actor_id,
+                object_id=object_id,
+                receiver=receiver,
+            )
+        )
     db.session.commit()
 
 
-def push_comment_notification(photo_id, receiver, page=1):
-    photo_url = url_for("main.show_photo", id=photo_id, page=page)
-    message = (
-        f'User <a href="{photo_url}#comments">This photo</a> has new comment/reply.'
+def push_follow_notification(follower, receiver):
+    push_notification(NotificationType.FOLLOW, receiver, actor=follower)
+    NOTIFICATIONS.labels("follow").inc()
+
+
+def push_comment_notification(photo_id, receiver, actor=None):
+    push_notification(
+        NotificationType.COMMENT, receiver, actor=actor, object_id=photo_id
     )
-    notification = Notification(message=message, receiver=receiver)
-    db.session.add(notification)
-    db.session.commit()
+    NOTIFICATIONS.labels("comment").inc()
 
 
 def push_collect_notification(user, photo_id, receiver):
-    user_url = url_for("user.index", username=user.username)
-    photo_url = url_for("main.show_photo", id=photo_id)
-    message = f'User <a href="{user_url}">{user.username}</a> collected your <a href="{photo_url}">photo</a>.'
-    notification = Notification(message=message, receiver=receiver)
-    db.session.add(notification)
-    db.session.commit()
+    push_notification(
+        NotificationType.COLLECT, receiver, actor=user, object_id=photo_id
+    )
+    NOTIFICATIONS.labels("collect").inc()
+
+
+def load_actors(notifications):
+    ids = {notification.actor_id for notification in notifications} - {None}
+    if not ids:
+        return {}
+    return {
+        row.id: row
+        for row in db.session.execute(
+            select(User.id, User.username).filter(User.id.in_(ids))
+        )
+    }
+
+
+def prune_notifications(days=None, chunk_size=None, progress=None):
+    days = days or current_app.config["NOTIFICATION_RETENTION_DAYS"]
+    chunk_size = chunk_size or current_app.config["MODERATION_CHUNK_SIZE"]
+    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+    expired = select(Notification.id).filter(
+        Notification.is_read, Notification.created_at < cutoff
+    )
+    total = db.session.scalar(expired.with_only_columns(func.count(Notification.id)))
+    query = expired.limit(chunk_size)
+    done = 0
+    while ids := db.session.scalars(query).all():
+        db.session.execute(delete(Notification).filter(Notification.id.in_(ids)))
+        db.session.commit()
+        done += len(ids)
+        if progress is not None:
+            progress(done, total)
+    return done
+
+
+def _parse_legacy(message):
+    if match := LEGACY_FOLLOW.match(message):
+        return NotificationType.FOLLOW, unquote(match[1]), None
+    if match := LEGACY_COLLECT.match(message):
+        return NotificationType.COLLECT, unquote(match[1]), int(match[2])
+    if match := LEGACY_COMMENT.match(message):
+        return NotificationType.COMMENT, None, int(match[1])
+    return None
+
+
+def notification_table_size():
+    dialect = db.engine.dialect.name
+    if dialect == "sqlite":
+        query = "SELECT sum(payload) FROM dbstat WHERE name = 'notification'"
+    elif dialect == "postgresql":
+        query = "SELECT pg_total_relation_size('notification')"
+    else:
+        return None
+    try:
+        return db.session.scalar(text(query))
+    except OperationalError:
+        db.session.rollback()
+        return None
+
+
+def migrate_notifications(chunk_size=None, progress=None):
+    chunk_size = chunk_size or current_app.config["MODERATION_CHUNK_SIZE"]
+    legacy = select(Notification.id, Notification.message).filter(
+        Notification.type == NotificationType.MESSAGE
+    )
+    total = db.session.scalar(legacy.with_only_columns(func.count(Notification.id)))
+    last_id = done = converted = 0
+    while rows := db.session.execute(
+        legacy.filter(Notification.id > last_id)
+        .order_by(Notification.id)
+        .limit(chunk_size)
+    ).all():
+        parsed = {row.id: _parse_legacy(row.message) for row in rows}
+        usernames = {value[1] for value in parsed.values() if value and value[1]}
+        actors = dict(
+            db.session.execute(
+                select(User.username, User.id).filter(User.username.in_(usernames))
+            ).all()
+        )
+        values = []
+        for id, value in parsed.items():
+            if value is None:
+                continue
+            type, username, object_id = value
+            if username is not None and username not in actors:
+                continue
+            values.append(
+                dict(
+                    id=id,
+                    type=type,
+                    actor_id=actors.get(username),
+                    object_id=object_id,
+                    message="",
+                )
+            )
+        if values:
+            db.session.execute(update(Notification), values)
+        db.session.commit()
+        last_id = rows[-1].id
+        done += len(rows)
+        converted += len(values)
+        if progress is not None:
+            progress(done, total)
+    return converted
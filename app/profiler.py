@@ -0,0 +1,180 @@
+import sys
+import threading
+from collections import Counter
+from pathlib import Path
+from time import monotonic, perf_counter, time
+from uuid import uuid4
+
+from flask import current_app, g, request
+from flask_login import current_user
+from sqlalchemy import delete, func, insert, select
+
+from app.extensions import db
+from app.models import ProfilerTarget, RequestProfile
+
+PROFILER_HEADER = "X-Profile"
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_qualname} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+
+def collapse(frame):
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def parse(stacks):
+    for line in stacks.splitlines():
+        stack, _, count = line.rpartition(" ")
+        yield stack.split(";"), int(count)
+
+
+def hottest(stacks, limit=30):
+    own = Counter()
+    total = Counter()
+    for frames, count in parse(stacks):
+        own[frames[-1]] += count
+        for name in set(frames):
+            total[name] += count
+    return [
+        dict(name=name, own=count, total=total[name])
+        for name, count in own.most_common(limit)
+    ]
+
+
+class Sampler:
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+
+    def start(self):
+        self.started_at = perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = perf_counter() - self.started_at
+
+    def collapsed(self):
+        return "\n".join(
+            f"{stack} {count}" for stack, count in self.stacks.most_common()
+        )
+
+
+def start_profiling(endpoint=None, user_id=None, header=False, limit=10, minutes=10):
+    target = dict(
+        id=uuid4().hex,
+        endpoint=endpoint or None,
+        user_id=user_id,
+        token=uuid4().hex if header else None,
+        limit=limit,
+        until=time() + minutes * 60,
+    )
+    db.session.execute(delete(ProfilerTarget))
+    db.session.add(ProfilerTarget(**target))
+    db.session.commit()
+    current_app.extensions["profiler"] = dict(target=target, checked_at=monotonic())
+    return target
+
+
+def stop_profiling():
+    db.session.execute(delete(ProfilerTarget))
+    db.session.commit()
+    current_app.extensions["profiler"] = dict(target=None, checked_at=monotonic())
+
+
+def _load_target():
+    target = db.session.scalar(
+        select(ProfilerTarget)
+        .filter(ProfilerTarget.until > time())
+        .order_by(ProfilerTarget.until.desc())
+        .limit(1)
+    )
+    if target is None:
+        return None
+    return dict(
+        id=target.id,
+        endpoint=target.endpoint,
+        user_id=target.user_id,
+        token=target.token,
+        limit=target.limit,
+        until=target.until,
+    )
+
+
+def current_target():
+    state = current_app.extensions.setdefault(
+        "profiler", dict(target=None, checked_at=None)
+    )
+    refresh = current_app.config["PROFILER_REFRESH_INTERVAL"]
+    if state["checked_at"] is None or monotonic() - state["checked_at"] >= refresh:
+        state["target"] = _load_target()
+        state["checked_at"] = monotonic()
+    target = state["target"]
+    if target is None or target["until"] < time():
+        return None
+    return target
+
+
+def _matches(target):
+    if target["endpoint"] and request.endpoint != target["endpoint"]:
+        return False
+    if target["token"] and request.headers.get(PROFILER_HEADER) != target["token"]:
+        return False
+    if target["user_id"]:
+        return current_user.is_authenticated and current_user.id == target["user_id"]
+    return True
+
+
+def start_sampler():
+    target = current_target()
+    if target is None or not _matches(target):
+        return
+    captured = db.session.scalar(
+        select(func.count(RequestProfile.id)).filter_by(session=target["id"])
+    )
+    if captured >= target["limit"]:
+        return
+    sampler = Sampler(threading.get_ident(), current_app.config["PROFILER_INTERVAL"])
+    g.profiler = (target, sampler)
+    sampler.start()
+
+
+def save_sample(exception=None):
+    profiler = g.pop("profiler", None)
+    if profiler is None:
+        return
+    target, sampler = profiler
+    sampler.stop()
+    with db.engine.begin() as connection:
+        connection.execute(
+            insert(RequestProfile).values(
+                session=target["id"],
+                endpoint=request.endpoint or "unmatched",
+                path=request.full_path[:255],
+                user_id=current_user.id if current_user.is_authenticated else None,
+                duration=sampler.duration,
+                samples=sum(sampler.stacks.values()),
+                stacks=sampler.collapsed(),
+            )
+        )
+
+
+def init_profiler(app):
+    app.before_request(start_sampler)
+    app.teardown_request(save_sample)
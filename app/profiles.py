@@ -0,0 +1,78 @@
+from flask import current_app, render_template
+from flask_login import current_user
+from markupsafe import Markup
+from sqlalchemy import select
+
+from app.extensions import cache, db
+from app.models import User
+from app.state import followers_count, is_following, photos_count
+
+PROFILE_CARD_TEMPLATE = "main/_profile_card.html"
+PROFILE_POPUP_TEMPLATE = "main/profile_popup.html"
+
+
+def card_key(profile):
+    return f"user:{profile.id}:{profile.version}:popup"
+
+
+def profiles_query(ids, viewer_id=None):
+    columns = [User.id, User.username, User.version]
+    if viewer_id is not None:
+        columns += [
+            is_following(viewer_id, User.id).label("following"),
+            is_following(User.id, viewer_id).label("follows_you"),
+        ]
+    return select(*columns).where(User.id.in_(ids))
+
+
+def cards_query(ids):
+    return select(
+        User,
+        followers_count(User.id).label("followers_count"),
+        photos_count(User.id).label("photos_count"),
+    ).where(User.id.in_(ids))
+
+
+def render_popups(template, profiles, cards, **context):
+    return {
+        profile.id: template.render(
+            profile=profile, card=Markup(cards[profile.id]), **context
+        )
+        for profile in profiles
+    }
+
+
+def load_popups(ids):
+    viewer_id = current_user.id if current_user.is_authenticated else None
+    profiles = db.session.execute(profiles_query(ids, viewer_id)).all()
+    if not profiles:
+        return {}
+    cards = dict(
+        zip(
+            [profile.id for profile in profiles],
+            cache.get_many(*map(card_key, profiles)),
+        )
+    )
+    missing = [id for id, card in cards.items() if card is None]
+    if missing:
+        for user, followers, photos in db.session.execute(cards_query(missing)):
+            cards[user.id] = render_template(
+                PROFILE_CARD_TEMPLATE,
+                user=user,
+                followers_count=followers,
+                photos_count=photos,
+            )
+        cache.set_many(
+            {
+                card_key(profile): cards[profile.id]
+                for profile in profiles
+                if profile.id in missing and cards[profile.id] is not None
+            },
+            timeout=current_app.config["PROFILE_CACHE_TIMEOUT"],
+        )
+    return render_popups(
+        current_app.jinja_env.get_template(PROFILE_POPUP_TEMPLATE),
+        [profile for profile in profiles if cards[profile.id] is not None],
+        cards,
+        current_user=current_user,
+    )
@@ -0,0 +1,128 @@
+import random
+import sqlite3
+from functools import wraps
+from time import monotonic, time
+
+from flask import current_app, g, has_app_context, has_request_context
+from flask import session as cookie
+from flask_sqlalchemy.session import Session
+from sqlalchemy import Select, event, select, update
+from sqlalchemy.exc import SQLAlchemyError
+
+PRIMARY_UNTIL_KEY = "_primary_until"
+
+
+class ReplicaSet:
+    def _state(self):
+        return current_app.extensions.setdefault(
+            "replicas", {"checked_at": None, "status": {}}
+        )
+
+    def beat(self, engine):
+        from app.models import Heartbeat
+
+        with engine.begin() as connection:
+            now = time()
+            if not connection.execute(
+                update(Heartbeat).filter_by(id=1).values(beat_at=now)
+            ).rowcount:
+                connection.execute(
+                    Heartbeat.__table__.insert().values(id=1, beat_at=now)
+                )
+
+    def lag(self, engine):
+        from app.models import Heartbeat
+
+        with engine.connect() as connection:
+            beat_at = connection.scalar(select(Heartbeat.beat_at).filter_by(id=1))
+        return None if beat_at is None else max(time() - beat_at, 0.0)
+
+    def check(self, engines):
+        state = self._state()
+        state["checked_at"] = monotonic()
+        max_lag = current_app.config["REPLICA_MAX_LAG"]
+        status = {}
+        for key in current_app.config["REPLICA_BINDS"]:
+            try:
+                lag = self.lag(engines[key])
+            except SQLAlchemyError:
+                lag = None
+            status[key] = dict(lag=lag, healthy=lag is not None and lag <= max_lag)
+        state["status"] = status
+        return status
+
+    def status(self, engines):
+        state = self._state()
+        interval = current_app.config["REPLICA_CHECK_INTERVAL"]
+        if state["checked_at"] is None or monotonic() - state["checked_at"] >= interval:
+            return self.check(engines)
+        return state["status"]
+
+    def choose(self, engines):
+        healthy = [key for key, s in self.status(engines).items() if s["healthy"]]
+        return engines[random.choice(healthy)] if healthy else None
+
+
+replicas = ReplicaSet()
+
+
+def read_from_replica(func):
+    @wraps(func)
+    def inner(*args, **kwargs):
+        g.read_replica = True
+        return func(*args, **kwargs)
+
+    return inner
+
+
+def sync_replica(source, target):
+    src, dst = sqlite3.connect(source), sqlite3.connect(target)
+    src.backup(dst)
+    src.close()
+    dst.close()
+
+
+class RoutingSession(Session):
+    def _use_replica(self, clause):
+        if (
+            clause is None
+            or self._flushing
+            or self.info.get("primary")
+            or not isinstance(clause, Select)
+            or clause._for_update_arg is not None
+        ):
+            return False
+        if not has_app_context() or not current_app.config["REPLICA_BINDS"]:
+            return False
+        if not g.get("read_replica"):
+            return False
+        if has_request_context() and cookie.get(PRIMARY_UNTIL_KEY, 0) > time():
+            return False
+        return True
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if bind is None and engine is self._db.engine and self._use_replica(clause):
+            return replicas.choose(self._db.engines) or engine
+        return engine
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def stick_to_primary(session, flush_context):
+    session.info["primary"] = True
+
+
+@event.listens_for(RoutingSession, "do_orm_execute")
+def stick_to_primary_on_write(orm_execute_state):
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info["primary"] = True
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def remember_write(session):
+    if (
+        session.info.get("primary")
+        and has_request_context()
+        and current_app.config["REPLICA_BINDS"]
+    ):
+        cookie[PRIMARY_UNTIL_KEY] = time() + current_app.config["REPLICA_STICKY_TIME"]
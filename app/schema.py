@@ -0,0 +1,72 @@
+from flask import current_app
+from sqlalchemy import func, inspect, select, text, update
+
+from app.caching import invalidate_page_cache
+from app.extensions import db
+from app.models import Collection, Photo
+
+SCHEMA_COLUMNS = {
+    "photo": {
+        "version": "INTEGER NOT NULL DEFAULT 0",
+        "collections_count": "INTEGER NOT NULL DEFAULT 0",
+    },
+    "user": {
+        "version": "INTEGER NOT NULL DEFAULT 0",
+    },
+    "notification": {
+        "type": "SMALLINT NOT NULL DEFAULT 0",
+        "actor_id": 'INTEGER REFERENCES "user" (id) ON DELETE CASCADE',
+        "object_id": "INTEGER",
+        "count": "INTEGER NOT NULL DEFAULT 1",
+    },
+}
+
+
+def upgrade_table(name, columns):
+    existing = {column["name"] for column in inspect(db.engine).get_columns(name)}
+    added = []
+    for column, definition in columns.items():
+        if column not in existing:
+            db.session.execute(
+                text(f'ALTER TABLE "{name}" ADD COLUMN {column} {definition}')
+            )
+            added.append(column)
+    db.session.commit()
+    return added
+
+
+def upgrade_schema():
+    db.create_all()
+    added = {}
+    for name, columns in SCHEMA_COLUMNS.items():
+        added[name] = upgrade_table(name, columns)
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+    return added
+
+
+def backfill_collections_count(chunk_size=None, progress=None):
+    chunk_size = chunk_size or current_app.config["MODERATION_CHUNK_SIZE"]
+    total = db.session.scalar(select(func.count(Photo.id)))
+    counts = (
+        select(func.count(Collection.user_id))
+        .filter(Collection.photo_id == Photo.id)
+        .scalar_subquery()
+    )
+    last_id = done = 0
+    while ids := db.session.scalars(
+        select(Photo.id).filter(Photo.id > last_id).order_by(Photo.id).limit(chunk_size)
+    ).all():
+        db.session.execute(
+            update(Photo)
+            .filter(Photo.id.in_(ids), Photo.collections_count != counts)
+            .values(collections_count=counts, version=Photo.version + 1)
+        )
+        db.session.commit()
+        last_id = ids[-1]
+        done += len(ids)
+        if progress is not None:
+            progress(done, total)
+    invalidate_page_cache()
+    return done
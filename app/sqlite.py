@@ -0,0 +1,179 @@
+import sqlite3
+import tempfile
+from pathlib import Path
+from threading import RLock, Thread
+from time import monotonic, perf_counter, sleep
+from weakref import WeakKeyDictionary
+
+from sqlalchemy import create_engine, event, func, select, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.extensions import db
+
+_writer_locks = WeakKeyDictionary()
+
+
+def configure_engine(engine, pragmas, single_writer=False):
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    if single_writer:
+        timeout = pragmas.get("busy_timeout", 5000) / 1000
+        _writer_locks[engine] = (RLock(), timeout)
+
+
+def _acquire_writer(session):
+    if "writer_lock" in session.info:
+        return
+    writer = _writer_locks.get(session.get_bind())
+    if writer is None:
+        return
+    lock, timeout = writer
+    # on timeout fall through and let SQLite's busy handler arbitrate
+    if lock.acquire(timeout=timeout):
+        session.info["writer_lock"] = lock
+
+
+@event.listens_for(Session, "before_flush")
+def serialize_flush(session, flush_context, instances):
+    _acquire_writer(session)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def serialize_execute(orm_execute_state):
+    if not orm_execute_state.is_select:
+        _acquire_writer(orm_execute_state.session)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def release_writer(session, transaction):
+    if transaction.parent is None and "writer_lock" in session.info:
+        session.info.pop("writer_lock").release()
+
+
+def checkpoint(engine, mode="PASSIVE"):
+    with engine.connect() as connection:
+        return connection.execute(text(f"PRAGMA wal_checkpoint({mode})")).one()
+
+
+def init_sqlite(app):
+    with app.app_context():
+        engine = db.engine
+        replicas = [db.engines[key] for key in app.config["REPLICA_BINDS"]]
+    pragmas = app.config["SQLITE_PRAGMAS"]
+    configure_engine(engine, pragmas, app.config["SQLITE_SINGLE_WRITER"])
+    for replica in replicas:
+        configure_engine(replica, pragmas)
+
+    interval = app.config["SQLITE_CHECKPOINT_INTERVAL"]
+    if (
+        not interval
+        or engine.dialect.name != "sqlite"
+        or str(pragmas.get("journal_mode", "")).upper() != "WAL"
+    ):
+        return
+    app.extensions["sqlite_checkpoint"] = monotonic()
+
+    @app.teardown_appcontext
+    def periodic_checkpoint(exception):
+        now = monotonic()
+        if now - app.extensions["sqlite_checkpoint"] >= interval:
+            app.extensions["sqlite_checkpoint"] = now
+            checkpoint(engine)
+
+
+def _percentile(values, percent):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, len(values) * percent // 100)] * 1000
+
+
+def run_benchmark(
+    app,
+    source,
+    pragmas,
+    single_writer=False,
+    readers=8,
+    writers=2,
+    duration=5.0,
+    hold=0.01,
+):
+    from app.models import Comment, Photo
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "benchmark.sqlite"
+        src, dst = sqlite3.connect(source), sqlite3.connect(path)
+        src.backup(dst)
+        src.close()
+        dst.close()
+
+        engine = create_engine(f"sqlite:///{path}", pool_size=readers + writers)
+        configure_engine(engine, pragmas, single_writer)
+        Session = sessionmaker(engine)
+        with Session() as session:
+            photo = session.scalars(select(Photo).limit(1)).first()
+        if photo is None:
+            engine.dispose()
+            return None
+
+        latencies = dict(read=[], write=[])
+        errors = []
+        deadline = monotonic() + duration
+
+        def read():
+            with Session() as session:
+                session.scalars(
+                    select(Photo).order_by(Photo.created_at.desc()).limit(20)
+                ).all()
+                session.scalar(select(func.count(Comment.id)))
+
+        def write():
+            with Session() as session:
+                session.add(
+                    Comment(
+                        body="benchmark", author_id=photo.author_id, photo_id=photo.id
+                    )
+                )
+                session.flush()
+                sleep(hold)
+                session.commit()
+
+        def worker(kind, operation):
+            with app.app_context():
+                while monotonic() < deadline:
+                    start = perf_counter()
+                    try:
+                        operation()
+                    except OperationalError as e:
+                        errors.append(str(e.orig))
+                        continue
+                    latencies[kind].append(perf_counter() - start)
+
+        threads = [Thread(target=worker, args=("read", read)) for _ in range(readers)]
+        threads += [
+            Thread(target=worker, args=("write", write)) for _ in range(writers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        engine.dispose()
+
+    return dict(
+        reads=len(latencies["read"]) / duration,
+        writes=len(latencies["write"]) / duration,
+        errors=len(errors),
+        read_p50=_percentile(latencies["read"], 50),
+        read_p95=_percentile(latencies["read"], 95),
+        write_p50=_percentile(latencies["write"], 50),
+        write_p95=_percentile(latencies["write"], 95),
+    )
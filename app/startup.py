@@ -0,0 +1,45 @@
+from importlib import import_module
+from pathlib import Path
+
+from jinja2 import FileSystemBytecodeCache
+from sqlalchemy.orm import configure_mappers
+
+from app.extensions import db, whooshee
+
+PRELOAD_MODULES = ("PIL.Image", "flask_avatars", "jwt")
+
+
+def compile_templates(app):
+    names = app.jinja_env.list_templates(extensions=["html", "txt"])
+    for name in names:
+        app.jinja_env.get_template(name)
+    return names
+
+
+def preload(app):
+    for name in PRELOAD_MODULES:
+        import_module(name)
+    configure_mappers()
+    compile_templates(app)
+
+
+def warmup(app):
+    from app.models import roles
+
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+            engine.connect().close()
+        roles.load()
+        for whoosheer in whooshee.whoosheers:
+            whooshee.get_or_create_index(app, whoosheer)
+    client = app.test_client()
+    for url in app.config["WARMUP_URLS"]:
+        client.get(url)
+
+
+def init_templates(app):
+    directory = app.config["TEMPLATE_CACHE_DIR"]
+    if directory:
+        Path(directory).mkdir(parents=True, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(str(directory))
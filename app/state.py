@@ -0,0 +1,91 @@
+from sqlalchemy import exists, func, select
+
+from app.models import Collection, Comment, Follow, Photo, User
+
+
+def followers_count(user_id):
+    return (
+        select(func.count())
+        .select_from(Follow)
+        .where(Follow.followed_id == user_id)
+        .scalar_subquery()
+    )
+
+
+def following_count(user_id):
+    return (
+        select(func.count())
+        .select_from(Follow)
+        .where(Follow.follower_id == user_id)
+        .scalar_subquery()
+    )
+
+
+def photos_count(user_id):
+    return (
+        select(func.count())
+        .select_from(Photo)
+        .where(Photo.author_id == user_id)
+        .scalar_subquery()
+    )
+
+
+def comments_count(photo_id):
+    return (
+        select(func.count())
+        .select_from(Comment)
+        .where(Comment.photo_id == photo_id)
+        .scalar_subquery()
+    )
+
+
+def is_following(follower_id, followed_id):
+    return exists().where(
+        Follow.follower_id == follower_id, Follow.followed_id == followed_id
+    )
+
+
+def is_collecting(user_id, photo_id):
+    return exists().where(
+        Collection.user_id == user_id, Collection.photo_id == photo_id
+    )
+
+
+def users_state(ids, viewer_id=None):
+    columns = [
+        User.id,
+        followers_count(User.id).label("followers"),
+        following_count(User.id).label("following"),
+        photos_count(User.id).label("photos"),
+    ]
+    if viewer_id is not None:
+        columns += [
+            is_following(viewer_id, User.id).label("is_following"),
+            is_following(User.id, viewer_id).label("follows_you"),
+        ]
+    return select(*columns).where(User.id.in_(ids))
+
+
+def photos_state(ids, viewer_id=None):
+    columns = [
+        Photo.id,
+        Photo.collections_count.label("collectors"),
+        comments_count(Photo.id).label("comments"),
+    ]
+    if viewer_id is not None:
+        columns.append(is_collecting(viewer_id, Photo.id).label("collected"))
+    return select(*columns).where(Photo.id.in_(ids))
+
+
+def by_id(result):
+    return {
+        row.id: {key: value for key, value in row._mapping.items() if key != "id"}
+        for row in result
+    }
+
+
+def requested_ids(args):
+    return (
+        list(dict.fromkeys(args.getlist("user", type=int))),
+        list(dict.fromkeys(args.getlist("photo", type=int))),
+    )
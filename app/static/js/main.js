@@ -11,6 +11,15 @@ document.addEventListener('DOMContentLoaded', () => {
     })
   }
 
+  let reportModal = document.getElementById('report-modal')
+  let reportForm = document.querySelector('.report-form')
+
+  if (reportModal && reportForm) {
+    reportModal.addEventListener('show.bs.modal', event => {
+      reportForm.setAttribute('action', event.relatedTarget.dataset.href)
+    })
+  }
+
   let descriptionBtn = document.getElementById('description-btn')
   let cancelDescription = document.getElementById('cancel-description')
   let description = document.getElementById('description')
@@ -28,18 +37,63 @@ document.addEventListener('DOMContentLoaded', () => {
       description.style.display = 'block'
     })
 
+  let profiles = new Map()
+  let pendingProfiles = new Set()
+  let prefetchTimer
+  let profileBatchSize = 50
+
+  let profileObserver = new IntersectionObserver(entries => {
+    entries.forEach(entry => {
+      if (!entry.isIntersecting) return
+      profileObserver.unobserve(entry.target)
+      let id = entry.target.dataset.profileId
+      if (id && !profiles.has(id)) pendingProfiles.add(id)
+    })
+    clearTimeout(prefetchTimer)
+    prefetchTimer = setTimeout(prefetchProfiles, 200)
+  })
+
   document.querySelectorAll('.profile-popover').forEach(el => {
     el.addEventListener('mouseenter', showProfilePopover)
     el.addEventListener('mouseleave', hideProfilePopover)
+    profileObserver.observe(el)
   })
 
+  async function prefetchProfiles() {
+    let ids = [...pendingProfiles]
+    pendingProfiles.clear()
+    for (let i = 0; i < ids.length; i += profileBatchSize) {
+      let params = new URLSearchParams()
+      ids
+        .slice(i, i + profileBatchSize)
+        .forEach(id => params.append('id', id))
+      try {
+        let res = await fetch(profilesUrl + '?' + params)
+        let data = await res.json()
+        for (let [id, html] of Object.entries(data)) {
+          profiles.set(id, html)
+        }
+      } catch (error) {
+        console.error('Prefetch error:', error)
+      }
+    }
+  }
+
+  async function loadProfile(el) {
+    let id = el.dataset.profileId
+    if (profiles.has(id)) return profiles.get(id)
+    let res = await fetch(el.dataset.href)
+    let data = await res.text()
+    if (id) profiles.set(id, data)
+    return data
+  }
+
   function showProfilePopover(event) {
     let el = event.target
     hoverTimer = setTimeout(async () => {
       hoverTimer = null
       try {
-        let res = await fetch(el.dataset.href)
-        let data = await res.text()
+        let data = await loadProfile(el)
         let popover = bootstrap.Popover.getOrCreateInstance(el, {
           content: data,
           html: true,
@@ -108,7 +162,8 @@ document.addEventListener('DOMContentLoaded', () => {
       let data = await res.json()
       el.previousElementSibling.style.display = 'inline-block'
       el.style.display = 'none'
-      updateFollowersCount(id)
+      profiles.delete(id)
+      hydrate([id], [])
       toast(data.message)
     } catch (error) {
       handleFetchError(error)
@@ -126,7 +181,8 @@ document.addEventListener('DOMContentLoaded', () => {
       let data = await res.json()
       el.nextElementSibling.style.display = 'inline-block'
       el.style.display = 'none'
-      updateFollowersCount(id)
+      profiles.delete(id)
+      hydrate([id], [])
       toast(data.message)
     } catch (error) {
       handleFetchError(error)
@@ -147,7 +203,7 @@ document.addEventListener('DOMContentLoaded', () => {
       let data = await res.json()
       el.previousElementSibling.style.display = 'block'
       el.style.display = 'none'
-      updateCollectorsCount(id)
+      hydrate([], [id])
       toast(data.message)
     } catch (error) {
       handleFetchError(error)
@@ -168,7 +224,7 @@ document.addEventListener('DOMContentLoaded', () => {
       let data = await res.json()
       el.nextElementSibling.style.display = 'block'
       el.style.display = 'none'
-      updateCollectorsCount(id)
+      hydrate([], [id])
       toast(data.message)
     } catch (error) {
       handleFetchError(error)
@@ -237,28 +293,77 @@ document.addEventListener('DOMContentLoaded', () => {
     })
   }
 
-  async function updateFollowersCount(id) {
-    let el = document.getElementById('followers-count-' + id)
+  async function hydrate(users, photos) {
+    let params = new URLSearchParams()
+    users.forEach(id => params.append('user', id))
+    photos.forEach(id => params.append('photo', id))
+    if (!params.size) return
     try {
-      let res = await fetch(el.dataset.href)
+      let res = await fetch(stateUrl + '?' + params)
       let data = await res.json()
-      el.textContent = data.count
+      renderState('user', data.users)
+      renderState('photo', data.photos)
+      for (let [id, state] of Object.entries(data.photos)) {
+        if (!('collected' in state)) continue
+        document
+          .querySelectorAll(`.uncollect-btn[data-id="${id}"]`)
+          .forEach(el => (el.style.display = state.collected ? 'block' : 'none'))
+        document
+          .querySelectorAll(`.collect-btn[data-id="${id}"]`)
+          .forEach(el => (el.style.display = state.collected ? 'none' : 'block'))
+      }
     } catch (error) {
       handleFetchError(error)
     }
   }
 
-  async function updateCollectorsCount(id) {
-    let el = document.getElementById('collectors-count-' + id)
-    try {
-      let res = await fetch(el.dataset.href)
-      let data = await res.json()
-      el.textContent = data.count
-    } catch (error) {
-      handleFetchError(error)
+  function renderState(kind, states) {
+    for (let [id, state] of Object.entries(states)) {
+      document
+        .querySelectorAll(`[data-${kind}-id="${id}"][data-state]`)
+        .forEach(el => (el.textContent = state[el.dataset.state]))
     }
   }
 
+  function hydratePage() {
+    let users = new Set()
+    let photos = new Set()
+    document
+      .querySelectorAll('[data-user-id]')
+      .forEach(el => users.add(el.dataset.userId))
+    document
+      .querySelectorAll('[data-photo-id]')
+      .forEach(el => photos.add(el.dataset.photoId))
+    document
+      .querySelectorAll('.collect-btn, .uncollect-btn')
+      .forEach(el => photos.add(el.dataset.id))
+    let ids = [
+      ...[...users].map(id => ['user', id]),
+      ...[...photos].map(id => ['photo', id])
+    ]
+    for (let i = 0; i < ids.length; i += stateMaxIds) {
+      let chunk = ids.slice(i, i + stateMaxIds)
+      hydrate(
+        chunk.filter(([kind]) => kind === 'user').map(([, id]) => id),
+        chunk.filter(([kind]) => kind === 'photo').map(([, id]) => id)
+      )
+    }
+  }
+
+  function showCommentActions() {
+    let comments = document.getElementById('comments')
+    if (!comments || !comments.dataset.viewerId) return
+    let viewerId = comments.dataset.viewerId
+    let canDelete = JSON.parse(comments.dataset.canDelete)
+    comments.querySelectorAll('.comment-actions').forEach(el => {
+      let own = el.dataset.authorId === viewerId
+      el.querySelector('.comment-reply').classList.toggle('hide', own)
+      el.querySelector('.comment-report').classList.toggle('hide', own)
+      el.querySelector('.comment-delete').classList.toggle('hide', !(own || canDelete))
+      el.classList.remove('hide')
+    })
+  }
+
   async function updateNotificationsCount() {
     let el = document.getElementById('notification-badge')
     if (!el) return
@@ -284,4 +389,6 @@ document.addEventListener('DOMContentLoaded', () => {
   let tooltipList = tooltipTriggerList.map(el => new bootstrap.Tooltip(el))
 
   renderAllDatetime()
+  showCommentActions()
+  hydratePage()
 })
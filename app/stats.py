@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app
+from sqlalchemy import case, func, select, true
+
+from app.extensions import cache, db
+from app.models import Comment, Photo, StatsSnapshot, Tag, User
+
+STATS_CACHE_KEY = "admin:stats"
+
+
+def _count_if(condition):
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+def count_stats():
+    users = select(
+        func.count(User.id).label("user_count"),
+        _count_if(User.locked).label("locked_user_count"),
+        _count_if(~User.active).label("blocked_user_count"),
+    ).subquery()
+    photos = select(
+        func.count(Photo.id).label("photo_count"),
+        _count_if(Photo.flag > 0).label("reported_photo_count"),
+    ).subquery()
+    tags = select(func.count(Tag.id).label("tag_count")).subquery()
+    comments = select(
+        func.count(Comment.id).label("comment_count"),
+        _count_if(Comment.flag > 0).label("reported_comment_count"),
+    ).subquery()
+    row = db.session.execute(
+        select(users, photos, tags, comments).select_from(
+            users.join(photos, true()).join(tags, true()).join(comments, true())
+        )
+    ).one()
+    return row._asdict()
+
+
+def record_snapshot(stats=None):
+    snapshot = StatsSnapshot(**(stats or count_stats()))
+    db.session.add(snapshot)
+    db.session.commit()
+    return snapshot
+
+
+def _as_dict(snapshot):
+    columns = StatsSnapshot.__table__.columns.keys()
+    return {key: getattr(snapshot, key) for key in columns}
+
+
+def get_stats():
+    stats = cache.get(STATS_CACHE_KEY)
+    if stats is not None:
+        return stats
+    current = count_stats()
+    length = current_app.config["STATS_HISTORY_LENGTH"]
+    history = db.session.scalars(
+        select(StatsSnapshot).order_by(StatsSnapshot.created_at.desc()).limit(length)
+    ).all()
+    interval = timedelta(seconds=current_app.config["STATS_SNAPSHOT_INTERVAL"])
+    now = datetime.now(timezone.utc)
+    if (
+        not history
+        or history[0].created_at.replace(tzinfo=timezone.utc) < now - interval
+    ):
+        history = [record_snapshot(current), *history[: length - 1]]
+    stats = dict(
+        current=current,
+        previous=_as_dict(history[1]) if len(history) > 1 else None,
+        history=[_as_dict(snapshot) for snapshot in history],
+    )
+    cache.set(STATS_CACHE_KEY, stats, timeout=current_app.config["STATS_CACHE_TIMEOUT"])
+    return stats
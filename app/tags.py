@@ -0,0 +1,46 @@
+from sqlalchemy import delete, exists, literal, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.caching import invalidate_page_cache
+from app.extensions import db, whooshee
+from app.models import Photo, Tag, photo_tag
+
+
+def _insert(table):
+    if db.session.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
+
+def add_tags(photo, names):
+    names = list(dict.fromkeys(names))
+    if not names:
+        return
+    inserted = db.session.execute(
+        _insert(Tag)
+        .values([dict(name=name) for name in names])
+        .on_conflict_do_nothing(index_elements=["name"])
+        .returning(Tag.id, Tag.name)
+    ).all()
+    db.session.execute(
+        _insert(photo_tag)
+        .from_select(
+            ["photo_id", "tag_id"],
+            select(literal(photo.id), Tag.id).filter(Tag.name.in_(names)),
+        )
+        .on_conflict_do_nothing()
+    )
+    photo.version = Photo.version + 1
+    db.session.commit()
+    invalidate_page_cache()
+    for row in inserted:
+        whooshee.on_commit([[Tag(id=row.id, name=row.name), "insert"]])
+
+
+def remove_tag(photo, tag):
+    db.session.execute(delete(photo_tag).filter_by(photo_id=photo.id, tag_id=tag.id))
+    photo.version = Photo.version + 1
+    if not db.session.scalar(select(exists().where(photo_tag.c.tag_id == tag.id))):
+        db.session.delete(tag)
+    db.session.commit()
+    invalidate_page_cache()
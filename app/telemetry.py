@@ -0,0 +1,122 @@
+import os
+from time import perf_counter
+
+from flask import g, request
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+
+REQUEST_LATENCY = Histogram(
+    "sunny_request_duration_seconds",
+    "Request latency by endpoint.",
+    ["blueprint", "endpoint", "method"],
+)
+REQUESTS = Counter(
+    "sunny_requests_total",
+    "Requests by endpoint and status code.",
+    ["blueprint", "endpoint", "method", "status"],
+)
+IMAGE_PROCESSING = Histogram(
+    "sunny_image_processing_seconds",
+    "Time spent resizing uploaded images.",
+    ["width"],
+)
+UPLOADS = Counter("sunny_uploads_total", "Uploaded photos.")
+NOTIFICATIONS = Counter("sunny_notifications_total", "Pushed notifications.", ["kind"])
+EMAILS = Counter("sunny_emails_total", "Emails by delivery result.", ["result"])
+EMAIL_QUEUE = Gauge(
+    "sunny_email_queue_depth",
+    "Emails waiting to be delivered.",
+    multiprocess_mode="livesum",
+)
+DB_CONNECTIONS = Gauge(
+    "sunny_db_connections_in_use",
+    "Pooled database connections checked out.",
+    ["bind"],
+    multiprocess_mode="livesum",
+)
+DB_CHECKOUT = Histogram(
+    "sunny_db_checkout_seconds",
+    "Time spent getting a connection from the pool, including the wait when "
+    "it is exhausted.",
+    ["bind"],
+)
+DB_CONNECTS = Counter(
+    "sunny_db_connects_total", "New database connections opened.", ["bind"]
+)
+WHOOSH_WRITES = Histogram(
+    "sunny_whoosh_write_seconds",
+    "Time spent writing to the search index, including the writer lock wait.",
+)
+WHOOSH_LOCK_ERRORS = Counter(
+    "sunny_whoosh_lock_errors_total", "Index writes that timed out on the lock."
+)
+
+
+def generate_metrics():
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry)
+
+
+def _labels():
+    return {
+        "blueprint": request.blueprint or "",
+        "endpoint": request.endpoint or "unmatched",
+        "method": request.method,
+    }
+
+
+def start_timer():
+    g.request_start = perf_counter()
+
+
+def observe_request(response):
+    start = g.pop("request_start", None)
+    if start is not None:
+        labels = _labels()
+        REQUEST_LATENCY.labels(**labels).observe(perf_counter() - start)
+        REQUESTS.labels(status=response.status_code, **labels).inc()
+    return response
+
+
+def _watch_pool(engine, bind):
+    raw_connection = engine.raw_connection
+
+    def timed_raw_connection():
+        with DB_CHECKOUT.labels(bind).time():
+            return raw_connection()
+
+    engine.raw_connection = timed_raw_connection
+
+    @event.listens_for(engine, "connect")
+    def count_connect(dbapi_connection, connection_record):
+        DB_CONNECTS.labels(bind).inc()
+
+    @event.listens_for(engine, "checkout")
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        DB_CONNECTIONS.labels(bind).inc()
+
+    @event.listens_for(engine, "checkin")
+    def checkin(dbapi_connection, connection_record):
+        DB_CONNECTIONS.labels(bind).dec()
+
+
+def init_telemetry(app):
+    from app.extensions import db
+
+    app.before_request(start_timer)
+    app.after_request(observe_request)
+    with app.app_context():
+        for key, engine in db.engines.items():
+            _watch_pool(engine, key or "default")
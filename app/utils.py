@@ -1,9 +1,11 @@
+from itertools import islice
 from pathlib import Path
 from urllib.parse import urljoin, urlparse
 from uuid import uuid4
 
 from flask import current_app, flash, redirect, request, url_for
-from PIL import Image
+
+from app.telemetry import IMAGE_PROCESSING
 
 
 def is_safe_url(target):
@@ -34,20 +36,31 @@ def allowed_file(filename):
 
 
 def resize_image(image, filename, base_width):
-    ext = Path(filename).suffix
-    img = Image.open(image)
-    if img.size[0] <= base_width:
-        return filename + ext
-    w_percent = base_width / float(img.size[0])
-    h_size = int(float(img.size[1]) * float(w_percent))
-    img = img.resize((base_width, h_size), Image.LANCZOS)
+    from PIL import Image
+
+    with IMAGE_PROCESSING.labels(base_width).time():
+        ext = Path(filename).suffix
+        img = Image.open(image)
+        if img.size[0] <= base_width:
+            return filename + ext
+        w_percent = base_width / float(img.size[0])
+        h_size = int(float(img.size[1]) * float(w_percent))
+        img = img.resize((base_width, h_size), Image.LANCZOS)
 
-    filename += current_app.config["PHOTO_SUFFIXES"][base_width] + ext
-    img.save(current_app.config["UPLOAD_PATH"] / filename, optimize=True, quality=85)
-    return filename
+        filename += current_app.config["PHOTO_SUFFIXES"][base_width] + ext
+        img.save(
+            current_app.config["UPLOAD_PATH"] / filename, optimize=True, quality=85
+        )
+        return filename
 
 
 def flash_errors(form):
     for field, errors in form.errors.items():
         for error in errors:
             flash(f"Error in the {getattr(form, field).label.text} field - {error}")
+
+
+def batched(items, size):
+    items = iter(items)
+    while chunk := list(islice(items, size)):
+        yield chunk